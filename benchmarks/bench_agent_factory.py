@@ -0,0 +1,51 @@
+"""
+Per-call agent overhead: building a fresh agent per tool call (old path)
+vs borrowing a prebuilt one from the AgentPool (current path).
+No model calls are made.
+
+    python benchmarks/bench_agent_factory.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import time
+
+SUB_AGENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sub_agents")
+sys.path.insert(0, SUB_AGENTS)
+os.chdir(SUB_AGENTS)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import budget_agent
+import stock_agent
+
+
+def bench_build(factory, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        factory()
+    return (time.perf_counter() - start) / n
+
+
+async def bench_pool(pool, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        async with pool.acquire():
+            pass
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'server':<10}{'build per call':>18}{'pooled':>14}{'speedup':>10}")
+    for name, factory, pool in (
+        # Old budget path also re-read the memory file on every call
+        ("budget", lambda: (budget_agent.get_memory(), budget_agent.budget_agent()), budget_agent.budget_pool),
+        ("stock", stock_agent.stock_agent, stock_agent.stock_pool),
+    ):
+        build = bench_build(factory, n)
+        pooled = asyncio.run(bench_pool(pool, n))
+        print(f"{name:<10}{build * 1e6:>15.1f} us{pooled * 1e6:>11.1f} us{build / pooled:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
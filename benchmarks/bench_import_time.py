@@ -0,0 +1,133 @@
+"""
+Start-up time per entry point: how long `import <module>` takes in a fresh
+interpreter, and for the sub-agent servers how much longer until their
+background warm-up finishes (the moment /ready turns 200).
+
+    python benchmarks/bench_import_time.py                    # all entry points, 5 runs each
+    python benchmarks/bench_import_time.py --only stock_agent --top 10
+    python benchmarks/bench_import_time.py --json import_times.json
+
+Each run is a new subprocess with its own temp working directory, so caches,
+SQLite files and the research index never carry over between runs. Nothing
+touches the network: API keys are dummies and no request is made.
+--top lists the packages that took longest, from `python -X importtime`.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+ENTRY_POINTS = {
+    "stock_agent": "sub_agents",
+    "budget_agent": "sub_agents",
+    "research_agent": "sub_agents",
+    "run_gradio": "orchestrator_agent",
+}
+
+# Runs in the child: time the import, then wait for the module's warm-up if it has one
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter() - started
+warmup = getattr(module, "warmup", None)
+ready = None
+if warmup is not None:
+    if not warmup.done.wait(float(sys.argv[2])):
+        raise SystemExit("warm-up did not finish in time")
+    if warmup.error:
+        raise SystemExit(f"warm-up failed: {warmup.error}")
+    ready = time.perf_counter() - started
+print(json.dumps({"import": imported, "ready": ready}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(ENTRY_POINTS), help="repeatable; default all")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for warm-up")
+    parser.add_argument("--top", type=int, default=0, help="also list the N packages that took longest to import")
+    parser.add_argument("--json", help="write the report to this file")
+    return parser.parse_args()
+
+
+def child_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "sk-fake",
+        "TAVILY_API_KEY": env.get("TAVILY_API_KEY") or "tvly-fake",
+        "METRICS_PORT": "0",
+        "TELEMETRY_JSONL": os.path.join(workdir, "traces.jsonl"),
+        "BUDGET_MEMORY_DB": os.path.join(workdir, "budget_memory.sqlite"),
+        "ORCHESTRATOR_MEMORY_DB": os.path.join(workdir, "orchestrator_memory.sqlite"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.sqlite"),
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search_cache.sqlite"),
+        "RESEARCH_INDEX_DIR": os.path.join(workdir, "research_index"),
+    })
+    return env
+
+
+def run_once(module: str, args, extra=()) -> subprocess.CompletedProcess:
+    with tempfile.TemporaryDirectory(prefix="import-bench-") as workdir:
+        env = child_env(workdir)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.join(ROOT, ENTRY_POINTS[module]), env.get("PYTHONPATH")]))
+        proc = subprocess.run(
+            [sys.executable, *extra, "-c", PROBE, module, str(args.timeout)],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=args.timeout + 60,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{module} failed:\n{proc.stderr[-2000:]}")
+    return proc
+
+
+def slowest_packages(module: str, args) -> list:
+    """(seconds, package): `-X importtime` self time summed per top-level package."""
+    proc = run_once(module, args, extra=("-X", "importtime"))
+    # Nesting in this output is unreliable once the warm-up thread imports in parallel,
+    # so sum each module's own time under its top-level package instead
+    totals = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own) / 1e6
+    return sorted(((s, p) for p, s in totals.items()), reverse=True)[: args.top]
+
+
+def main():
+    args = parse_args()
+    report = {}
+    for module in args.only or ENTRY_POINTS:
+        runs = [json.loads(run_once(module, args).stdout.strip().splitlines()[-1]) for _ in range(args.repeat)]
+        imports = [r["import"] for r in runs]
+        readies = [r["ready"] for r in runs if r["ready"] is not None]
+        entry = {
+            "import_p50_s": round(statistics.median(imports), 3),
+            "import_min_s": round(min(imports), 3),
+            "ready_p50_s": round(statistics.median(readies), 3) if readies else None,
+        }
+        if args.top:
+            entry["slowest_packages"] = [{"package": name, "seconds": round(s, 3)} for s, name in slowest_packages(module, args)]
+        report[module] = entry
+
+    print(f"{'entry point':<16} {'import p50':>11} {'import min':>11} {'ready p50':>10}")
+    for module, entry in report.items():
+        ready = f"{entry['ready_p50_s']:.3f}s" if entry["ready_p50_s"] is not None else "-"
+        print(f"{module:<16} {entry['import_p50_s']:>10.3f}s {entry['import_min_s']:>10.3f}s {ready:>10}")
+        for row in entry.get("slowest_packages", []):
+            print(f"    {row['seconds']:>7.3f}s  {row['package']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"repeat": args.repeat, "entry_points": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+A local stand-in for the OpenAI chat completions API.
+
+Answers every request after a configurable delay with canned markdown and
+configurable token counts, streams when asked, and fills structured-output
+requests (response_format json_schema) with a valid instance of the schema.
+Point agents at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeModelConfig:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, output_tokens: int = 300,
+                 reasoning_tokens: int = 200, cached_ratio: float = 0.0, stream_chunks: int = 20):
+        self.latency = latency
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.cached_ratio = cached_ratio
+        self.stream_chunks = stream_chunks
+        self.requests = 0
+
+
+def _guess_intents(text: str) -> list:
+    text = text.lower()
+    intents = [name for name, words in (
+        ("budget", ("budget", "income", "rent", "spend", "save")),
+        ("stock", ("stock", "price", "share", "p/e", "ticker")),
+        ("research", ("what is", "explain", "roth", "ira", "401k", "how does")),
+    ) if any(w in text for w in words)]
+    return intents or ["research"]
+
+
+def _instance(schema: dict, defs: dict, name: str, prompt: str):
+    """Smallest valid value for a JSON schema, with a few field-name aware guesses."""
+    if "$ref" in schema:
+        return _instance(defs[schema["$ref"].split("/")[-1]], defs, name, prompt)
+    for combo in ("anyOf", "oneOf", "allOf"):
+        if combo in schema:
+            return _instance(schema[combo][0], defs, name, prompt)
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _instance(sub, defs, key, prompt) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        if name == "intent":
+            return _guess_intents(prompt)
+        return [_instance(schema.get("items", {}), defs, name, prompt)]
+    if kind == "number":
+        return 0.9
+    if kind == "integer":
+        return 1
+    if kind == "boolean":
+        return True
+    if name.endswith("_query") or name == "processed_input":
+        # The user's message is the last line block of the NLU prompt
+        return prompt.strip().splitlines()[-1] if prompt.strip() else ""
+    return ""
+
+
+def _content(words: int) -> str:
+    vocabulary = ("budget", "savings", "market", "growth", "risk", "income", "allocation",
+                  "returns", "volatility", "plan", "rate", "goal")
+    lines = ["## Summary", ""]
+    body = " ".join(random.choice(vocabulary) for _ in range(max(words, 1)))
+    lines.append(body[0].upper() + body[1:] + ".")
+    lines += ["", "| Item | Value |", "|---|---|", "| Example | 42 |"]
+    return "\n".join(lines)
+
+
+def _usage(prompt_tokens: int, config: FakeModelConfig) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": config.output_tokens + config.reasoning_tokens,
+        "total_tokens": prompt_tokens + config.output_tokens + config.reasoning_tokens,
+        "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * config.cached_ratio)},
+        "completion_tokens_details": {"reasoning_tokens": config.reasoning_tokens},
+    }
+
+
+def make_handler(config: FakeModelConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            config.requests += 1
+            time.sleep(max(config.latency + random.uniform(-config.jitter, config.jitter), 0))
+
+            messages = body.get("messages", [])
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            last_user = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+            prompt_tokens = max(len(prompt) // 4, 1)
+            fmt = body.get("response_format") or {}
+            if fmt.get("type") == "json_schema":
+                schema = fmt["json_schema"]["schema"]
+                text = json.dumps(_instance(schema, schema.get("$defs", {}), "", last_user))
+            elif fmt.get("type") == "json_object":
+                text = "{}"
+            else:
+                text = _content(config.output_tokens // 2)
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = body.get("model", "gpt-5-nano")
+            if body.get("stream"):
+                self._stream(completion_id, model, text, _usage(prompt_tokens, config),
+                             (body.get("stream_options") or {}).get("include_usage", False))
+                return
+            payload = {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": _usage(prompt_tokens, config),
+            }
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, completion_id, model, text, usage, include_usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(obj):
+                line = f"data: {obj if isinstance(obj, str) else json.dumps(obj)}\n\n".encode()
+                self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            pieces = re.findall(r".{1,%d}" % max(len(text) // config.stream_chunks, 1), text, re.S)
+            for i, piece in enumerate(pieces):
+                delta = {"content": piece} if i else {"role": "assistant", "content": piece}
+                send({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(config.latency / max(config.stream_chunks * 4, 1))
+            send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if include_usage:
+                send({**base, "choices": [], "usage": usage})
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_fake_openai(port: int = 0, config: FakeModelConfig = None):
+    """Start the server on a daemon thread. Returns (server, base_url)."""
+    config = config or FakeModelConfig()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -0,0 +1,69 @@
+"""
+Offline stand-ins for the sub-agents' external services: yfinance (through
+the MarketData fetchers), Tavily and IP geolocation. Each fake sleeps for a
+configurable latency so the benchmark still sees realistic I/O waits.
+"""
+import random
+import time
+
+
+def install_fake_market_data(latency: float = 0.2):
+    import numpy as np
+    import pandas as pd
+    import market_data
+
+    def history(tickers):
+        time.sleep(latency)
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252)
+        out = {}
+        for t in tickers:
+            rng = np.random.default_rng(abs(hash(t)) % 2**32)
+            close = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.02, len(index))))
+            out[t] = pd.DataFrame({
+                "Open": close * 0.995, "High": close * 1.01, "Low": close * 0.99,
+                "Close": close, "Adj Close": close, "Volume": rng.integers(1_000_000, 50_000_000, len(index)),
+            }, index=index)
+        return out
+
+    def fundamentals(tickers):
+        time.sleep(latency)
+        return {t: {"shortName": f"{t} Inc.", "sector": "Technology", "marketCap": 1e12,
+                    "trailingPE": round(random.uniform(10, 60), 2), "forwardPE": round(random.uniform(10, 40), 2),
+                    "trailingEps": 4.2, "priceToBook": 8.1} for t in tickers}
+
+    def recommendations(tickers):
+        time.sleep(latency)
+        return {t: {"summary": [{"period": "0m", "strongBuy": 10, "buy": 20, "hold": 8, "sell": 1, "strongSell": 0}],
+                    "recent_changes": []} for t in tickers}
+
+    market_data.MarketData._fetch_history = staticmethod(history)
+    market_data.MarketData._fetch_fundamentals = staticmethod(fundamentals)
+    market_data.MarketData._fetch_recommendations = staticmethod(recommendations)
+
+
+def fake_search_results(query: str, latency: float = 0.3) -> dict:
+    time.sleep(latency)
+    return {
+        "query": query,
+        "results": [
+            {"title": f"{query} explained", "url": f"https://example.com/{i}",
+             "content": f"Background on {query}. " * 20, "score": 0.9 - i * 0.1}
+            for i in range(3)
+        ],
+    }
+
+
+def install_fake_tavily(latency: float = 0.3):
+    try:
+        import tavily
+    except ImportError:
+        return
+    tavily.TavilyClient.search = lambda self, query, **kwargs: fake_search_results(query, latency)
+    tavily.TavilyClient.extract = lambda self, urls, **kwargs: {
+        "results": [{"url": u, "raw_content": "Example page content. " * 50} for u in (urls if isinstance(urls, list) else [urls])]
+    }
+
+
+def install_fake_geolocation():
+    from geolocation import StaticGeoProvider, set_geo_provider
+    set_geo_provider(StaticGeoProvider({"status": "success", "countryCode": "US", "region": "NY", "city": "New York"}))
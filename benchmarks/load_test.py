@@ -0,0 +1,202 @@
+"""
+Load test for orchestrator -> budget/stock/research MCP servers, fully offline.
+
+Starts the three FastMCP servers in-process on free ports, backed by a fake
+OpenAI endpoint (configurable latency and token counts), fake market data,
+fake Tavily and a static geolocation provider, then replays a corpus of
+mixed-intent queries through orchestrator_agent() at a fixed concurrency.
+
+    python benchmarks/load_test.py --concurrency 8 --requests 200 --model-latency 0.5
+    python benchmarks/load_test.py --json baseline.json   # save a regression baseline
+
+Reports requests/sec, p50/p99 latency overall and per stage, and peak RSS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(HERE, "corpus.jsonl"))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7, help="corpus order is replayable for a given seed")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--reasoning-tokens", type=int, default=200)
+    parser.add_argument("--io-latency", type=float, default=0.2, help="seconds per fake yfinance/Tavily call")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on (off by default)")
+    parser.add_argument("--json", help="write the report to this file")
+    return parser.parse_args()
+
+
+def setup_environment(args, workdir: str):
+    """Everything the servers and orchestrator read at import time."""
+    sys.path.insert(0, os.path.join(ROOT, "sub_agents"))
+    sys.path.insert(0, os.path.join(ROOT, "orchestrator_agent"))
+    sys.path.insert(0, HERE)
+    from fake_openai import FakeModelConfig, start_fake_openai
+
+    config = FakeModelConfig(
+        latency=args.model_latency, jitter=args.model_latency / 4,
+        output_tokens=args.output_tokens, reasoning_tokens=args.reasoning_tokens,
+    )
+    _, base_url = start_fake_openai(config=config)
+    ports = {name: free_port() for name in ("budget", "stock", "research")}
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "sk-fake",
+        "TAVILY_API_KEY": "tvly-fake",
+        "METRICS_PORT": "0",
+        "TELEMETRY_JSONL": os.path.join(workdir, "traces.jsonl"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.sqlite"),
+        "BUDGET_MEMORY_DB": os.path.join(workdir, "budget_memory.sqlite"),
+        "ORCHESTRATOR_MEMORY_DB": os.path.join(workdir, "orchestrator_memory.sqlite"),
+        **{f"{name.upper()}_MCP_URL": f"http://127.0.0.1:{port}/mcp" for name, port in ports.items()},
+    })
+    if not args.cache:
+        os.environ.update({"CACHE_TTL_STOCK": "0", "CACHE_TTL_BUDGET": "0", "CACHE_TTL_RESEARCH": "0"})
+    return ports, config
+
+
+def start_servers(ports: dict, args):
+    import fakes
+    import budget_agent
+    import stock_agent
+    import research_agent
+
+    fakes.install_fake_market_data(args.io_latency)
+    fakes.install_fake_tavily(args.io_latency)
+    fakes.install_fake_geolocation()
+    for name, module in (("budget", budget_agent), ("stock", stock_agent), ("research", research_agent)):
+        threading.Thread(
+            target=module.mcp.run,
+            kwargs={"transport": "streamable-http", "host": "127.0.0.1", "port": ports[name]},
+            name=f"{name}-mcp", daemon=True,
+        ).start()
+    for port in ports.values():
+        wait_for_port(port)
+
+
+def quantile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _by_model(spend: dict) -> dict:
+    totals = {}
+    for (_, model), value in spend.items():
+        totals[model] = totals.get(model, 0.0) + value
+    return totals
+
+
+async def drive(corpus, args, model_config):
+    import orchestrator_agent as orch
+    from telemetry import telemetry
+
+    await orch.ensure_mcp()
+    order = list(range(args.requests))
+    random.Random(args.seed).shuffle(order)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        query = corpus[order[i] % len(corpus)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await orch.orchestrator_agent(query["message"], session_id=f"bench-{i % args.concurrency}")
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                print(f"request {i} failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    stages = {
+        stage: {"count": hist.count, "p50": hist.quantile(0.50), "p99": hist.quantile(0.99)}
+        for stage, hist in telemetry.latency.items() if stage != "request"
+    }
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_s": round(quantile(latencies, 0.50), 3),
+        "latency_p99_s": round(quantile(latencies, 0.99), 3),
+        "stages": {k: {m: round(v, 3) if isinstance(v, float) else v for m, v in d.items()} for k, d in stages.items()},
+        "llm_calls": model_config.requests,
+        # Priced per model, so runs with MODEL_TIERING=0 and =1 can be compared
+        "cost_usd": round(sum(telemetry.spend.values()), 6),
+        "spend_by_model": {m: round(v, 6) for m, v in _by_model(telemetry.spend).items()},
+        "tier_calls": {f"{stage}/{tier}": n for (stage, tier), n in sorted(telemetry.tiers.items())},
+        # Estimated writer input summed over requests, before and after compaction
+        "writer_prompt_tokens": {"raw": telemetry.counters.get("writer_prompt_tokens_raw", 0),
+                                 "sent": telemetry.counters.get("writer_prompt_tokens_sent", 0)},
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    args = parse_args()
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    workdir = tempfile.mkdtemp(prefix="finance-bench-")
+    os.chdir(workdir)
+    ports, model_config = setup_environment(args, workdir)
+    start_servers(ports, args)
+    report = asyncio.run(drive(corpus, args, model_config))
+
+    print(f"\n{report['requests']} requests at concurrency {report['concurrency']} "
+          f"({report['errors']} errors) in {report['elapsed_s']}s")
+    print(f"throughput: {report['requests_per_s']} req/s   latency p50 {report['latency_p50_s']}s  p99 {report['latency_p99_s']}s")
+    print(f"LLM calls: {report['llm_calls']}   peak RSS: {report['peak_rss_mb']} MB")
+    print(f"cost: ${report['cost_usd']}  by model {report['spend_by_model']}")
+    print(f"tiers: {report['tier_calls']}")
+    print(f"writer input tokens: {report['writer_prompt_tokens']['raw']:.0f} raw -> "
+          f"{report['writer_prompt_tokens']['sent']:.0f} after compaction\n")
+    print(f"{'stage':<12}{'count':>8}{'p50 s':>10}{'p99 s':>10}")
+    for stage, data in report["stages"].items():
+        print(f"{stage:<12}{data['count']:>8}{data['p50']:>10}{data['p99']:>10}")
+    if args.json:
+        with open(os.path.join(ROOT, args.json) if not os.path.isabs(args.json) else args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
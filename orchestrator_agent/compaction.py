@@ -0,0 +1,211 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from util import estimate_tokens, truncate_tokens
+
+# WRITER_COMPACTION=0 sends the sub-agent answers to the writer untouched (for comparison)
+COMPACTION = os.getenv("WRITER_COMPACTION", "1") != "0"
+# Token budget per section in the writer prompt; stock reports run longest
+SECTION_TOKEN_BUDGETS = {
+    "budget": int(os.getenv("WRITER_BUDGET_TOKENS", 700)),
+    "stock": int(os.getenv("WRITER_STOCK_TOKENS", 900)),
+    "research": int(os.getenv("WRITER_RESEARCH_TOKENS", 700)),
+}
+DEFAULT_SECTION_TOKENS = int(os.getenv("WRITER_SECTION_TOKENS", 700))
+# The writer only needs the last turn or two to resolve references
+WRITER_HISTORY_TOKENS = int(os.getenv("WRITER_HISTORY_TOKENS", 300))
+TABLE_MAX_ROWS = int(os.getenv("WRITER_TABLE_MAX_ROWS", 20))
+MAX_SOURCES = int(os.getenv("WRITER_MAX_SOURCES", 10))
+
+# Headings whose whole block is boilerplate the writer adds back once at most
+_BOILERPLATE_HEADING = re.compile(r"\b(risk disclosures?|disclaimers?|important notice|not (financial|investment) advice)\b", re.I)
+# Stand-alone boilerplate paragraphs, wherever they appear
+_BOILERPLATE_TEXT = re.compile(
+    r"^(\W*)(this (is|does) not (constitute )?(financial|investment) advice|not (financial|investment) advice|"
+    r"past performance (is|does) not|investing involves risk|consult (a|with a|your) (licensed |qualified )?"
+    r"(financial|tax) (advisor|adviser|professional)|always do your own research|disclaimer)", re.I)
+# Per-section source lists; their links are already in the shared sources block
+_SOURCES_HEADING = re.compile(r"^(sources?|references?|citations?|further reading)$", re.I)
+_EMOJI = re.compile("[\U0001F300-\U0001FAFF\U00002600-\U000027BF\U0001F000-\U0001F2FF️]")
+_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)")
+_URL = re.compile(r"(?<![(\[])\bhttps?://[^\s)\]>]+(?<![.,;:!?])")
+_TRACKING = re.compile(r"^(utm_\w+|ref|ref_src|fbclid|gclid|mc_\w+)$", re.I)
+
+def _clean_url(url: str) -> str:
+    parts = urlsplit(url.rstrip(".,;"))
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING.match(k)])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+def _norm(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+# Citation placeholders while compacting ([src:i] after link text, [url:i] for a bare
+# URL); Sources.number() turns them into [n]
+_MARK = re.compile(r"(\s?)\[(src|url):(\d+)\]")
+_PARTIAL_MARK = re.compile(r"\s?\[(s|sr|src|u|ur|url)(:\d*)?(?=…$)")
+
+class Sources:
+    """
+    Citations from every section: the same URL is one source everywhere. Numbers are
+    given at the end, in order of first citation, to the first MAX_SOURCES sources
+    still cited once the sections are compacted. Markers for the rest are removed,
+    or replaced by the site name where a bare URL stood in the sentence.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.titles: Dict[str, str] = {}
+
+    def cite(self, url: str, title: Optional[str] = None) -> str:
+        url = _clean_url(url)
+        if url not in self.ids:
+            self.ids[url] = len(self.ids)
+            self.titles[url] = (title or "").strip()
+        return f"[{'src' if title else 'url'}:{self.ids[url]}]"
+
+    def number(self, texts: Dict[str, str]) -> Tuple[Dict[str, str], str]:
+        """(texts with [n] markers, sources block listing exactly those n)."""
+        urls = list(self.ids)
+        numbers, cited = {}, set()
+
+        def renumber(m):
+            i = int(m.group(3))
+            cited.add(i)
+            if i not in numbers and len(numbers) < MAX_SOURCES:
+                numbers[i] = len(numbers) + 1
+            if i in numbers:
+                return f"{m.group(1)}[{numbers[i]}]"
+            return f"{m.group(1)}{urlsplit(urls[i]).netloc}" if m.group(2) == "url" else ""
+
+        texts = {name: _MARK.sub(renumber, text) for name, text in texts.items()}
+        lines = [f"[{n}] {self.titles[urls[i]] + ' ' if self.titles[urls[i]] else ''}{urls[i]}"
+                 for i, n in numbers.items()]
+        if len(cited) > len(numbers):
+            lines.append(f"(+{len(cited) - len(numbers)} more)")
+        return texts, "\n".join(lines)
+
+def _replace_citations(text: str, sources: Sources) -> str:
+    text = _LINK.sub(lambda m: f"{m.group(1)} {sources.cite(m.group(2), m.group(1))}", text)
+    return _URL.sub(lambda m: sources.cite(m.group(0)), text)
+
+def _compact_table(lines: List[str]) -> str:
+    """Markdown table -> 'TABLE' plus one pipe-separated row per line, no padding or rule row."""
+    rows = []
+    for line in lines:
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        if all(re.fullmatch(r":?-{2,}:?", c) or not c for c in cells):
+            continue
+        rows.append("|".join(cells))
+    if len(rows) > TABLE_MAX_ROWS + 1:
+        rows = rows[:TABLE_MAX_ROWS + 1] + [f"(+{len(rows) - TABLE_MAX_ROWS - 1} more rows)"]
+    return "TABLE\n" + "\n".join(rows)
+
+def _blocks(text: str) -> List[Tuple[str, str]]:
+    """(kind, text) for each markdown block: heading, table or text."""
+    blocks, table = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            table.append(stripped)
+            continue
+        if table:
+            blocks.append(("table", _compact_table(table)))
+            table = []
+        if not stripped or re.fullmatch(r"[-*_=]{3,}", stripped):
+            blocks.append(("break", ""))
+        elif stripped.startswith("#"):
+            blocks.append(("heading", "## " + stripped.lstrip("#").strip()))
+        elif re.fullmatch(r"\*\*[^*]{1,60}\*\*:?|[A-Z][\w /&-]{1,40}:", stripped):
+            # A bold or "Title:" line on its own works as a heading
+            blocks.append(("heading", "## " + stripped.strip("*:").strip()))
+        else:
+            blocks.append(("text", stripped))
+    if table:
+        blocks.append(("table", _compact_table(table)))
+    return blocks
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+
+def compact_section(name: str, content: str, sources: Sources, seen: set) -> Tuple[str, bool]:
+    """
+    One sub-agent answer, compacted: emoji and rules dropped, boilerplate and headings
+    already used by an earlier section removed, tables and citations in compact form,
+    then cut to the section's token budget. Repeated text and table rows are kept:
+    a second "Total" or "N/A" row is real content. Returns (text, had_boilerplate).
+    """
+    text = _replace_citations(re.sub(r"[ \t]+([,.;:!?])", r"\1", _EMOJI.sub("", content or "")), sources)
+    kept, boilerplate, skipping = [], False, False
+    for kind, block in _blocks(text):
+        if kind == "heading":
+            title = block[3:]
+            skipping = bool(_BOILERPLATE_HEADING.search(title))
+            boilerplate |= skipping
+            skipping |= bool(_SOURCES_HEADING.match(title.strip()))
+            # Repeated headers: the section's own name, or one an earlier section already used
+            key = ("heading", _norm(title))
+            if skipping or not key[1] or _norm(title) in (_norm(name), _norm(name) + " analysis") or key in seen:
+                continue
+            seen.add(key)
+            kept.append((kind, block))
+        elif kind == "break":
+            # A heading ends a boilerplate block; a blank line after a one-line disclaimer does too
+            if kept and kept[-1][0] != "break":
+                kept.append((kind, block))
+        elif not skipping:
+            body = re.sub(r"^([-*+]|\d+\.)\s+", "- ", block) if kind == "text" else block
+            if kind == "text" and _BOILERPLATE_TEXT.match(re.sub(r"^[-*>\s]+", "", body).replace("*", "")):
+                boilerplate = True
+                continue
+            kept.append((kind, body.replace("**", "")))
+    # Drop headings left with nothing under them
+    kept = [b for i, b in enumerate(kept) if b[0] != "heading" or _next_kind(kept, i) not in (None, "heading")]
+    budget = SECTION_TOKEN_BUDGETS.get(name, DEFAULT_SECTION_TOKENS)
+    return _fit(kept, budget), boilerplate
+
+def _next_kind(blocks: List[Tuple[str, str]], i: int) -> Optional[str]:
+    """Kind of the first non-break block after i, None at the end."""
+    for kind, _ in blocks[i + 1:]:
+        if kind != "break":
+            return kind
+    return None
+
+def _render(blocks: List[Tuple[str, str]]) -> str:
+    out = "\n".join("" if kind == "break" else text for kind, text in blocks)
+    return re.sub(r"\n{3,}", "\n\n", out).strip()
+
+def _fit(blocks: List[Tuple[str, str]], budget: int) -> str:
+    """
+    Within budget: everything if it fits; else headings and tables in full and
+    each paragraph cut to its first sentence; then a hard cut at the budget.
+    """
+    text = _render(blocks)
+    if estimate_tokens(text) <= budget:
+        return text
+    text = _render([(k, _first_sentence(t) if k == "text" else t) for k, t in blocks])
+    # A citation marker cut in half by the hard cut is dropped
+    return _PARTIAL_MARK.sub("", truncate_tokens(text, budget))
+
+def compact_sections(results: dict) -> Tuple[Dict[str, str], str, bool]:
+    """
+    ({intent: compacted content}, sources block, had_boilerplate) for the answered
+    sections, in order. With WRITER_COMPACTION=0 the contents are returned as is.
+    """
+    answered = {name: r["content"] for name, r in results.items() if r["status"] == "ok" and r["content"]}
+    if not COMPACTION:
+        return answered, "", False
+    sources, seen, boilerplate = Sources(), set(), False
+    compacted = {}
+    for name, content in answered.items():
+        compacted[name], had = compact_section(name, content, sources, seen)
+        boilerplate |= had
+    compacted, sources_block = sources.number(compacted)
+    return compacted, sources_block, boilerplate
+
+def writer_history(past_context: str) -> str:
+    """The most recent part of the conversation, within WRITER_HISTORY_TOKENS."""
+    if not COMPACTION:
+        return past_context
+    return truncate_tokens(past_context, WRITER_HISTORY_TOKENS, keep="end")
@@ -0,0 +1,46 @@
+import os
+import re
+
+# auto: call the writer only when sections need merging; always: old behaviour; never: template only
+WRITER_MODE = os.getenv("WRITER_MODE", "auto")
+
+SECTION_TITLES = {"budget": "💰 Budget", "stock": "📈 Stock Analysis", "research": "📚 Research"}
+
+# Questions that tie the sections together ("can I afford ... given ...") need real merging
+_NEEDS_MERGE = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|should i|afford|instead|which|better|combine|"
+    r"based on (my|the)|given (my|the)|trade-?off|priorit\w*)\b", re.I)
+
+def plan_composition(message: str, results: dict) -> str:
+    """
+    Decide how to build the final answer from the sub-agent results:
+      'passthrough' - exactly one section answered and nothing failed; send it as is
+      'template'    - independent sections; stack them under headers locally
+      'writer'      - several sections the user asked to relate, or no intent at all
+                      (greetings, small talk), which the writer answers at the light tier
+    """
+    answered = [name for name, r in results.items() if r["status"] == "ok" and r["content"]]
+    failed = [name for name, r in results.items() if r["status"] != "ok"]
+    if WRITER_MODE == "always" or (not results and WRITER_MODE != "never"):
+        return "writer"
+    if len(answered) == 1 and not failed:
+        return "passthrough"
+    if WRITER_MODE == "never" or len(answered) <= 1 or not _NEEDS_MERGE.search(message):
+        return "template"
+    return "writer"
+
+def compose_sections(results: dict) -> str:
+    """Stack the answered sections under headers and note any that failed."""
+    answered = [(name, r["content"]) for name, r in results.items() if r["status"] == "ok" and r["content"]]
+    if len(answered) == 1 and len(results) == 1:
+        return answered[0][1]
+    parts = [f"## {SECTION_TITLES.get(name, name.title())}\n\n{content.strip()}" for name, content in answered]
+    failed = [name for name, r in results.items() if r["status"] != "ok"]
+    if failed:
+        parts.append(
+            "_Sorry, I couldn't get the " + " and ".join(failed)
+            + " part of your question answered right now. Please try again in a moment._"
+        )
+    if not parts:
+        return "Sorry, I couldn't work out what you need. Could you rephrase your question?"
+    return "\n\n---\n\n".join(parts)
@@ -0,0 +1,115 @@
+import os
+import re
+from typing import Callable, Optional
+
+from workflow_agents import IntentSpecificQuery, NLUOutput, UserProfile
+from market_data import extract_tickers
+
+# Rules must clear this confidence for the fast path; anything lower goes to nlu_agent
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 0.8))
+# Longer messages are rarely "obvious"; leave them to the NLU agent
+FAST_PATH_MAX_WORDS = int(os.getenv("FAST_PATH_MAX_WORDS", 40))
+
+_INTENT_PATTERNS = {
+    "stock": re.compile(
+        r"\b(stocks?|shares?|price|quote|ticker|p/?e|eps|market cap|dividends?|earnings|"
+        r"analysts?|52[- ]week|valuation|trading|bullish|bearish)\b", re.I),
+    "budget": re.compile(
+        r"\b(budget\w*|spend\w*|expenses?|rent|paycheck|income|make \$?[\d,.]+k?|"
+        r"earn\w*|bills?|debts?|afford|save \$|savings plan|allocate|groceries)\b", re.I),
+    "research": re.compile(
+        r"\b(what (is|are|does)|explain\w*|how (does|do|to)|difference between|"
+        r"roth|ira|401\(?k\)?|hsa|credit score|compound interest|index funds?|etfs?|"
+        r"tax[- ]advantaged|emergency fund|inflation)\b", re.I),
+}
+# Follow-ups that only make sense with history ("what about it?") need the NLU agent
+_REFERENCES_HISTORY = re.compile(
+    r"\b(it|that|those|them|this one|above|previous|earlier|again|same|instead)\b", re.I)
+
+# A place is capitalised words ("San Francisco", "Brooklyn, NY", "St. Louis"); the match
+# stops at the first lower-case word, so "in NYC help me budget" gives "NYC"
+_PLACE_WORD = r"(?!I\b)(?:(?:St|Ft|Mt)\.|[A-Z][A-Za-z'-]*)"
+_LOCATION = re.compile(
+    rf"\b(?:live|living|based|located|moving) (?:in|to) ({_PLACE_WORD}(?:(?:,\s*|\s+)(?:(?:of|de|la|del)\s+)?{_PLACE_WORD}){{0,4}})")
+# Keeps a trailing "a year" / "/month" so the budget engine can tell annual from monthly
+_INCOME = re.compile(
+    r"(?:make|earn|take home|net|income of)\D{0,10}?(\$?\s?[\d,.]+\s?k?"
+    r"(?:\s*(?:(?:a|per|each) (?:year|month|week)|/\s*(?:yr|year|mo|month|wk|week)|annually|yearly|monthly|weekly)\b)?)", re.I)
+
+# Optional local classifier: message -> (intents, confidence). Used when the rules are unsure.
+_local_classifier: Optional[Callable[[str], tuple]] = None
+
+def set_local_classifier(classifier: Optional[Callable[[str], tuple]]):
+    """Plug in a small local model, e.g. a fitted sklearn pipeline wrapped in a function."""
+    global _local_classifier
+    _local_classifier = classifier
+
+def _sentence_intents(sentence: str) -> set:
+    intents = {name for name, pattern in _INTENT_PATTERNS.items() if pattern.search(sentence)}
+    # A ticker next to budget words ("buy TSLA or pay off my debt?") makes two intents,
+    # so the mixed sentence goes to the NLU agent instead of losing the stock part
+    if extract_tickers(sentence):
+        intents.add("stock")
+    return intents
+
+def _profile(message: str, intents: list[str]) -> UserProfile:
+    location = _LOCATION.search(message)
+    income = _INCOME.search(message)
+    return UserProfile(
+        age_group="",
+        income=income.group(1).strip() if income else "",
+        location=location.group(1).strip() if location else "",
+        financial_interests=intents,
+    )
+
+def _build(message: str, queries: dict, confidence: float, past_context: str) -> NLUOutput:
+    intents = list(queries)
+    return NLUOutput(
+        intent=intents,
+        confidence=confidence,
+        user_profile=_profile(message, intents),
+        processed_input=message.strip(),
+        intent_specific_queries=IntentSpecificQuery(
+            budget_query=queries.get("budget", ""),
+            stock_query=queries.get("stock", ""),
+            research_query=queries.get("research", ""),
+        ),
+        chat_history=past_context,
+    )
+
+def fast_route(message: str, past_context: str = "") -> Optional[NLUOutput]:
+    """
+    Classify obvious messages locally and return the same NLUOutput the NLU agent
+    would, or None when the message is ambiguous and needs the NLU agent.
+
+    Every sentence must map to exactly one intent; sentences for the same intent
+    are joined into that intent's query.
+    """
+    text = message.strip()
+    if not text or len(text.split()) > FAST_PATH_MAX_WORDS:
+        return None
+    if past_context and _REFERENCES_HISTORY.search(text):
+        return None
+
+    queries = {}
+    for sentence in re.split(r"(?<=[.!?;])\s+|\s+\balso\b\s+", text):
+        if not sentence.strip():
+            continue
+        intents = _sentence_intents(sentence)
+        if len(intents) != 1:
+            break
+        intent = intents.pop()
+        queries[intent] = f"{queries[intent]} {sentence}".strip() if intent in queries else sentence.strip()
+    else:
+        if queries:
+            # Each extra intent is another chance the split is wrong
+            confidence = 0.95 - 0.05 * (len(queries) - 1)
+            if confidence >= FAST_PATH_MIN_CONFIDENCE:
+                return _build(text, queries, confidence, past_context)
+
+    if _local_classifier is not None:
+        intents, confidence = _local_classifier(text)
+        intents = [i for i in intents if i in _INTENT_PATTERNS]
+        if len(intents) == 1 and confidence >= FAST_PATH_MIN_CONFIDENCE:
+            return _build(text, {intents[0]: text}, confidence, past_context)
+    return None
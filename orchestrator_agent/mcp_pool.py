@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from telemetry import telemetry
+
+if TYPE_CHECKING:
+    from agno.tools.mcp import MCPTools
+
+# Sessions kept open per replica URL
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 2))
+# Seconds between liveness pings on an idle-or-busy session
+MCP_PING_INTERVAL = float(os.getenv("MCP_PING_INTERVAL", 15))
+MCP_PING_TIMEOUT = float(os.getenv("MCP_PING_TIMEOUT", 5))
+# Reconnect backoff, doubling from min to max
+MCP_RECONNECT_MIN = float(os.getenv("MCP_RECONNECT_MIN", 0.5))
+MCP_RECONNECT_MAX = float(os.getenv("MCP_RECONNECT_MAX", 30))
+# How long a call waits for any healthy session before giving up
+MCP_ACQUIRE_TIMEOUT = float(os.getenv("MCP_ACQUIRE_TIMEOUT", 10))
+# How long close() waits for in-flight calls before tearing sessions down
+MCP_DRAIN_TIMEOUT = float(os.getenv("MCP_DRAIN_TIMEOUT", 30))
+
+def replica_urls(name: str, default: str) -> List[str]:
+    """
+    Replica URLs for one sub-agent server:
+    STOCK_MCP_URLS="http://a:8001/mcp,http://b:8001/mcp", else STOCK_MCP_URL, else default.
+    """
+    urls = os.getenv(f"{name.upper()}_MCP_URLS") or os.getenv(f"{name.upper()}_MCP_URL") or default
+    return [u.strip() for u in urls.split(",") if u.strip()]
+
+def _mcp_tools():
+    from agno.tools.mcp import MCPTools
+    return MCPTools
+
+class _Slot:
+    """
+    One MCP session to one replica. A dedicated task owns the connection: it
+    connects, pings while healthy and reconnects with backoff when the session
+    breaks, so connect and close always happen in the same task.
+    """
+
+    def __init__(self, pool: "MCPPool", url: str):
+        self.pool = pool
+        self.url = url
+        self.client: Optional["MCPTools"] = None
+        self.in_flight = 0
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.ready = asyncio.Event()
+        self._broken = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name=f"mcp-{self.pool.name}-{self.url}")
+
+    def mark_broken(self, error: str):
+        self.last_error = error
+        self.ready.clear()
+        self._broken.set()
+
+    async def _run(self):
+        # agno.tools.mcp (and the mcp SDK) is the slowest import here; load it off the event loop
+        MCPTools = await asyncio.to_thread(_mcp_tools)
+        backoff = MCP_RECONNECT_MIN
+        while not self.pool.closing:
+            client = MCPTools(transport="streamable-http", url=self.url, timeout_seconds=int(self.pool.timeout))
+            try:
+                await client.connect()
+                self.client = client
+                self._broken.clear()
+                self.ready.set()
+                backoff = MCP_RECONNECT_MIN
+                await self._watch(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self.ready.clear()
+                self.client = None
+                await _safe_close(client, f"{self.pool.name} {self.url}")
+            if self.pool.closing:
+                break
+            self.reconnects += 1
+            telemetry.incr(f"mcp_reconnects_{self.pool.name}")
+            print(f"[mcp_pool] {self.pool.name} {self.url} down ({self.last_error}); retrying in {backoff:.1f}s")
+            try:
+                await asyncio.wait_for(self.pool.closed.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, MCP_RECONNECT_MAX)
+
+    async def _watch(self, client: "MCPTools"):
+        """Return when the session is broken or the pool is closing."""
+        while not self.pool.closing:
+            try:
+                await asyncio.wait_for(self._broken.wait(), timeout=MCP_PING_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if self.pool.closing:
+                return
+            await asyncio.wait_for(client.session.send_ping(), timeout=MCP_PING_TIMEOUT)
+
+class MCPPool:
+    """
+    A set of MCP sessions to every replica of one sub-agent server.
+    Calls go to the healthy session with the fewest calls in flight, so load
+    spreads across replicas, and a replica that restarts is reconnected in the
+    background while the others keep serving.
+    """
+
+    def __init__(self, name: str, urls: List[str], size: int = MCP_POOL_SIZE, timeout: float = 120):
+        self.name = name
+        self.urls = urls
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self.closing = False
+        self.closed: Optional[asyncio.Event] = None
+        self._slots: List[_Slot] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next = 0
+
+    def start(self):
+        """Start the connection tasks on the running loop. Safe to call more than once."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and not self.closing:
+            return
+        self._loop = loop
+        self.closing = False
+        self.closed = asyncio.Event()
+        self._slots = [_Slot(self, url) for _ in range(self.size) for url in self.urls]
+        for slot in self._slots:
+            slot.start()
+
+    async def wait_ready(self, timeout: float = MCP_ACQUIRE_TIMEOUT) -> bool:
+        """True once at least one session is up."""
+        self.start()
+        waiters = [asyncio.create_task(slot.ready.wait()) for slot in self._slots]
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            return bool(done)
+        finally:
+            for w in waiters:
+                w.cancel()
+
+    def _pick(self) -> Optional[_Slot]:
+        healthy = [s for s in self._slots if s.ready.is_set() and s.client is not None]
+        if not healthy:
+            return None
+        # Least in flight; rotate the starting point so ties alternate replicas
+        self._next = (self._next + 1) % len(healthy)
+        ordered = healthy[self._next:] + healthy[:self._next]
+        return min(ordered, key=lambda s: s.in_flight)
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Yield a live ClientSession. A failure other than a timeout marks that
+        session broken so its task reconnects; the error still propagates.
+        """
+        if self.closing:
+            raise ConnectionError(f"{self.name} MCP pool is closed")
+        self.start()
+        slot = self._pick()
+        if slot is None and await self.wait_ready(MCP_ACQUIRE_TIMEOUT):
+            slot = self._pick()
+        if slot is None:
+            errors = {s.last_error for s in self._slots if s.last_error}
+            raise ConnectionError(f"no healthy {self.name} MCP server ({'; '.join(errors) or 'connecting'})")
+        slot.in_flight += 1
+        try:
+            yield slot.client.session
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # A slow sub-agent is not a dead connection
+            raise
+        except Exception as e:
+            slot.mark_broken(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            slot.in_flight -= 1
+
+    def stats(self) -> List[Dict]:
+        return [
+            {"url": s.url, "healthy": s.ready.is_set(), "in_flight": s.in_flight,
+             "reconnects": s.reconnects, "last_error": s.last_error}
+            for s in self._slots
+        ]
+
+    async def close(self, drain_timeout: float = MCP_DRAIN_TIMEOUT):
+        """Stop handing out sessions, let in-flight calls finish, then close every session."""
+        if self._loop is None or self.closing:
+            return
+        self.closing = True
+        deadline = time.monotonic() + drain_timeout
+        while any(s.in_flight for s in self._slots) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self.closed.set()
+        for slot in self._slots:
+            slot._broken.set()
+        tasks = [s._task for s in self._slots if s._task]
+        _, pending = await asyncio.wait(tasks, timeout=MCP_PING_TIMEOUT) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        self._loop = None
+
+async def _safe_close(tool, name: str):
+    # Close only if a session exists; swallow errors so others still close
+    try:
+        if tool is not None and getattr(tool, "session", None):
+            await tool.close()
+    except Exception as e:
+        print(f"[mcp_pool] Warning: failed to close {name}: {e}")
+
+# Every pool created, so close_all can drain them at shutdown
+_pools: Dict[str, MCPPool] = {}
+
+def create_pool(name: str, default_url: str, timeout: float = 120) -> MCPPool:
+    size = int(os.getenv(f"{name.upper()}_MCP_POOL_SIZE", MCP_POOL_SIZE))
+    pool = _pools[name] = MCPPool(name, replica_urls(name, default_url), size=size, timeout=timeout)
+    return pool
+
+async def close_all():
+    """Drain pools in reverse order of creation."""
+    for name in reversed(list(_pools)):
+        try:
+            await _pools[name].close()
+        except Exception as e:
+            print(f"[mcp_pool] Warning: failed to close {name} pool: {e}")
+
+def close_all_blocking(timeout: float = MCP_DRAIN_TIMEOUT + MCP_PING_TIMEOUT):
+    """
+    close_all from outside the pools' event loop, e.g. an atexit hook. Does nothing
+    once that loop has stopped: its connection tasks are gone with it.
+    """
+    loops = {pool._loop for pool in _pools.values() if pool._loop is not None}
+    for loop in loops:
+        if not loop.is_running() or loop.is_closed():
+            continue
+        try:
+            asyncio.run_coroutine_threadsafe(close_all(), loop).result(timeout)
+        except Exception as e:
+            print(f"[mcp_pool] Warning: failed to close pools at exit: {type(e).__name__}: {e}")
@@ -1,16 +1,32 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
-import os, json, asyncio
+import os, sys, json, asyncio, time
 
-from agno.tools.mcp import MCPTools
-from agno.agent import RunOutput
-from collections import deque
 
-from workflow_agents import nlu_agent
-from workflow_agents import writer
+from workflow_agents import nlu_agents
+from workflow_agents import writers
+from workflow_agents import build_intent_requests
+from response_cache import ResponseCache, cache_hit_metrics, normalize_query
+from session_memory import SessionHistory
+from intent_router import fast_route
+from composer import plan_composition, compose_sections
+from compaction import compact_sections, writer_history
+from telemetry import Trace, telemetry
+from single_flight import SingleFlight, flight_key, follower_metrics
+from scheduler import scheduler, Overloaded
+from mcp_pool import create_pool
 
 from util import *
 
+# Shared per-user memory store lives with the sub-agents
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sub_agents"))
+from memory_store import create_store
+from prompt_layout import with_cache_metrics
+from model_tiers import choose_tier, max_tier, settings_for, tier_metrics
+
+if TYPE_CHECKING:
+    from agno.agent import RunOutput
+
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
@@ -20,132 +36,449 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 # Writer agent (async-friendly)
 async def ensure_mcp():
-    global _mcp_connected
-    if not _mcp_connected:
-        await _budget_mcp.connect()
-        await _stock_mcp.connect()
-        await _research_mcp.connect()
-        _mcp_connected = True
+    # Start every pool's connection tasks on this loop and wait for a first session.
+    # A server that is down doesn't block startup; its pool keeps reconnecting.
+    ready = await asyncio.gather(*(pool.wait_ready() for pool in _mcp_pools.values()))
+    for name, ok in zip(_mcp_pools, ready):
+        if not ok:
+            logger.warning(f"{name} MCP server not reachable yet; reconnecting in the background")
+
+def start_mcp():
+    """
+    Start any pool not yet running on this loop, without waiting for a session.
+    Requests wait only in pool.session(), for the intents they actually call.
+    """
+    for pool in _mcp_pools.values():
+        pool.start()
+
+# Bounded, per-session conversation history (summaries, not raw answers)
+conversation_memory = SessionHistory()
+
+# Per-tool deadlines in seconds; a slow sub-agent only delays its own section
+TOOL_DEADLINES = {
+    "budget": float(os.getenv("BUDGET_TOOL_DEADLINE", 120)),
+    "stock": float(os.getenv("STOCK_TOOL_DEADLINE", 240)),
+    "research": float(os.getenv("RESEARCH_TOOL_DEADLINE", 120)),
+}
+
+# Pooled, health-checked MCP sessions per sub-agent server.
+# Replicas: BUDGET/STOCK/RESEARCH_MCP_URLS as a comma separated list.
+_mcp_pools = {
+    "budget": create_pool("budget", "http://127.0.0.1:8000/mcp", timeout=TOOL_DEADLINES["budget"]),
+    "stock": create_pool("stock", "http://127.0.0.1:8001/mcp", timeout=TOOL_DEADLINES["stock"]),
+    "research": create_pool("research", "http://127.0.0.1:8002/mcp", timeout=TOOL_DEADLINES["research"]),
+}
+
+# Answers for repeated intent queries; hits never reach the MCP servers
+response_cache = ResponseCache()
+# Concurrent duplicates of a sub-agent call, NLU run or writer run wait on the first one
+tool_flight = SingleFlight("tool")
+nlu_flight = SingleFlight("nlu")
+writer_flight = SingleFlight("writer")
+
+# intent -> (MCP pool, tool name, argument name)
+_INTENT_TOOLS = {
+    "budget": (_mcp_pools["budget"], "create_budget", "message"),
+    "stock": (_mcp_pools["stock"], "finance_analyzer", "query"),
+    "research": (_mcp_pools["research"], "research", "message"),
+}
+
+async def _call_intent_tool(intent: str, payload, priority: int = 1) -> dict:
+    """
+    Call one sub-agent tool under its deadline.
+    Never raises: failures come back as a result with status 'timeout' or 'error'
+    so the other intents can still be written up.
+    """
+    result = await _run_intent_tool(intent, payload, priority)
+    result["intent"] = intent
+    return result
+
+async def _run_intent_tool(intent: str, payload, priority: int = 1) -> dict:
+    start = time.perf_counter()
+    cached = await response_cache.aget(intent, payload)
+    if cached is not None:
+        # Hit: skip the sub-agent entirely
+        return {"status": "ok", "content": cached["content"], "metrics": cache_hit_metrics(cached["metrics"]),
+                "wall_time": time.perf_counter() - start, "cached": True}
+    # Identical requests already in flight (same intent, normalized query and profile) share one call
+    result, shared = await tool_flight.run(
+        response_cache.make_key(intent, payload),
+        lambda: _invoke_intent_tool(intent, payload, priority),
+        max_wait=TOOL_DEADLINES[intent],
+    )
+    if not shared:
+        return result
+    result = {**result, "wall_time": time.perf_counter() - start, "coalesced": True}
+    if result["status"] == "ok":
+        result["metrics"] = follower_metrics(result.get("metrics"))
+    return result
+
+async def _invoke_intent_tool(intent: str, payload, priority: int = 1) -> dict:
+    pool, tool_name, arg_name = _INTENT_TOOLS[intent]
+    start = time.perf_counter()
+    slot_wait = 0.0
+    try:
+        # Waits for this intent's concurrency slot and the OpenAI rate budget;
+        # the tool deadline only starts once the call is actually sent
+        async with scheduler.slot(intent, priority) as usage:
+            slot_wait = usage["queue_wait"]
+            async with pool.session() as session:
+                call = await asyncio.wait_for(
+                    session.call_tool(tool_name, {arg_name: payload}),
+                    timeout=TOOL_DEADLINES[intent],
+                )
+            structured = getattr(call, "structuredContent", None)
+            if isinstance(structured, dict) and isinstance(structured.get("metrics"), dict):
+                usage["tokens"] = structured["metrics"].get("total_tokens")
+        result = call.structuredContent if hasattr(call, "content") else str(call)
+        if not isinstance(result, dict) or "content" not in result:
+            # Sub-agents return a "Tool error: ..." string when their run fails
+            raise RuntimeError(str(result)[:300])
+        tool_metrics = result.get("metrics") or {}
+        if result["content"]:
+            await response_cache.aput(intent, payload, result["content"], tool_metrics)
+        return {"status": "ok", "content": result["content"],
+                "metrics": {**tool_metrics, "cache_hits": 0, "cache_misses": 1},
+                "wall_time": time.perf_counter() - start, "slot_wait": slot_wait}
+    except Overloaded as e:
+        return {"status": "busy", "error": str(e), "wall_time": time.perf_counter() - start, "slot_wait": slot_wait}
+    except asyncio.TimeoutError:
+        return {"status": "timeout", "error": f"no response within {TOOL_DEADLINES[intent]:.0f}s",
+                "wall_time": time.perf_counter() - start, "slot_wait": slot_wait}
+    except Exception as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}",
+                "wall_time": time.perf_counter() - start, "slot_wait": slot_wait}
+
+async def dispatch_intents_iter(tool_inputs: dict, priority: int = 1):
+    """
+    Launch every intent's tool call at once and yield (intent, result) pairs
+    in the order they finish, so callers can report progress as it happens.
+    """
+    if not tool_inputs:
+        return
+    logger.info(f"Dispatching tools in parallel: {list(tool_inputs)}")
+    tasks = [
+        asyncio.create_task(_call_intent_tool(intent, payload, priority))
+        for intent, payload in tool_inputs.items()
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            yield result["intent"], result
+    finally:
+        # If the consumer goes away (client disconnected), don't leave calls running
+        for task in tasks:
+            task.cancel()
+
+async def dispatch_intents(tool_inputs: dict, priority: int = 1) -> dict:
+    """
+    Launch every intent's tool call at once and wait for all of them.
+    Latency is the slowest sub-agent (bounded by its deadline) instead of the sum.
+    Returns {intent: result} in the same order as tool_inputs.
+    """
+    results = {intent: result async for intent, result in dispatch_intents_iter(tool_inputs, priority)}
+    if results:
+        logger.info(f"Dispatch finished in {max(r['wall_time'] for r in results.values()):.2f}s")
+    return {intent: results[intent] for intent in tool_inputs}
+
+# Per-session user profile (replaces the single global orchestrator_memory.json)
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "orchestrator_memory.json")
+PROFILE_DB = os.getenv("ORCHESTRATOR_MEMORY_DB", "orchestrator_memory.sqlite")
+
+def default_profile() -> dict:
+    return {
+        "user_profile": {"location": None, "income_net": None, "preferences": {}},
+        "last_intent": None,
+    }
 
-conversation_memory = deque(maxlen=5)
+profile_store = create_store(PROFILE_DB, default_profile)
+profile_store.seed_from_json(PROFILE_FILE)
 
-# Persistent MCP tool clients (connect once)
-_budget_mcp = MCPTools(transport="streamable-http", url="http://127.0.0.1:8000/mcp", timeout_seconds=120)
-_stock_mcp  = MCPTools(transport="streamable-http", url="http://127.0.0.1:8001/mcp", timeout_seconds=240)
-_research_mcp = MCPTools(transport="streamable-http", url="http://127.0.0.1:8002/mcp", timeout_seconds=120)
-_mcp_connected = False
+def remember_profile(session_id: str, nlu) -> dict:
+    """Store what NLU learned about the user; fill gaps in its profile from earlier turns."""
+    stored = profile_store.get(session_id)["user_profile"]
+    profile = nlu.user_profile
+    learned = {}
+    if profile.location:
+        learned["location"] = profile.location
+    elif stored.get("location"):
+        profile.location = stored["location"]
+    if profile.income:
+        learned["income_net"] = profile.income
+    elif stored.get("income_net"):
+        profile.income = str(stored["income_net"])
+    return profile_store.update(session_id, {"user_profile": learned, "last_intent": nlu.intent})
 
 logger = setup_logger()
-async def orchestrator_agent(message: str) -> str:
+
+def _progress(text: str) -> dict:
+    return {"type": "progress", "text": text}
+
+BUSY_MESSAGE = (
+    "We're handling a lot of requests right now and couldn't get to yours. "
+    "Please try again in a minute."
+)
+
+async def orchestrator_stream(message: str, session_id: str = "default", client_ip: Optional[str] = None):
+    """
+    Run the whole pipeline as an async generator of events:
+      {"type": "progress", "text": ...}  stage updates ("budget running", "stock done")
+      {"type": "token", "text": ...}     writer output as it arrives
+      {"type": "done", "text": ..., "metrics": [...]}  final answer and metrics
+    Requests go through the scheduler's admission queue first; when it is full
+    the answer is a short busy message instead of a slow or failed run.
+    """
+    past_context = conversation_memory.context(session_id)
+    # Local routing is cheap, so it runs before admission to pick the priority
+    routed = fast_route(message, past_context)
+    priority = scheduler.priority(message, routed.intent if routed is not None else None)
+    try:
+        async with scheduler.admit(priority) as waited:
+            async for event in _pipeline(message, session_id, client_ip, past_context, routed, priority, waited):
+                yield event
+    except Overloaded as e:
+        logger.warning(f"Request rejected: {e}")
+        yield {"type": "token", "text": BUSY_MESSAGE}
+        yield {"type": "done", "text": BUSY_MESSAGE, "metrics": [], "rejected": True}
+
+async def _pipeline(message: str, session_id: str, client_ip: Optional[str], past_context: str,
+                    routed, priority: int, admission_wait: float):
     logger.info(f"Starting orchestration for message: {message[:50]}...")
+    started = time.perf_counter()
+    trace = Trace(session_id, message)
+    trace.add_span("admission", admission_wait, priority=priority)
     # 1) NLU (await and extract parsed Pydantic or fallback)
 
-    await ensure_mcp()
+    start_mcp()
     metrics=[]
 
-    past_context = "\n".join(
-         [f"User: {m['user']}\nAssistant: {m['response']}" for m in conversation_memory]
-    )
     nlu_input = (
-        f"Past conversation (most recent first):\n{past_context}\n\n"
+        f"Past conversation (most recent last):\n{past_context}\n\n"
         f"New user message:\n{message}"
     )
 
     try:
-        nlu_resp: RunOutput = await nlu_agent.arun(nlu_input)
-        response = nlu_resp.content
+        yield _progress("Understanding your question")
+        # Obvious messages are classified locally; only ambiguous ones pay for an NLU run
+        nlu_started = time.perf_counter()
+        response = routed
+        if response is not None:
+            logger.info(f"route=fast-path confidence={response.confidence:.2f}")
+            nlu_metrics = {"fast_path": 1}
+        else:
+            # Short questions are classified with minimal reasoning, long ones get more
+            nlu_settings = settings_for("nlu", choose_tier(message))
+            logger.info(f"route=nlu-agent tier={nlu_settings['tier']}")
+
+            async def run_nlu():
+                async with scheduler.slot("nlu", priority) as usage:
+                    nlu_resp: "RunOutput" = await nlu_agents[nlu_settings["tier"]].arun(nlu_input)
+                    usage["tokens"] = nlu_resp.metrics.total_tokens
+                return nlu_resp.content, with_cache_metrics({**nlu_resp.metrics.to_dict(), **tier_metrics(nlu_settings), "fast_path": 0})
+
+            # Same question with the same context already being classified: reuse that run
+            (response, nlu_metrics), shared = await nlu_flight.run(
+                flight_key(normalize_query(message), past_context), run_nlu)
+            if shared:
+                nlu_metrics = {**follower_metrics(nlu_metrics), "fast_path": 0}
+        trace.add_span("nlu", time.perf_counter() - nlu_started, nlu_metrics,
+                       route="fast-path" if nlu_metrics["fast_path"] else "nlu-agent", tier=nlu_metrics.get("tier"))
+        intent_requests = {}
         if hasattr(response, "intent") and response.intent is not None:
             intent = getattr(response, "intent", None)
-            intent_specific_queries = getattr(response, "intent_specific_queries", None)
-            budget_query = getattr(intent_specific_queries, "budget_query", None)
-            stock_query = getattr(intent_specific_queries, "stock_query", None)
-            research_query = getattr(intent_specific_queries, "research_query", None)
-            logger.info(f"==========nlu_cost==========\n{nlu_resp.metrics.to_dict()}")
+            # The NLU result may be shared with concurrent duplicates (nlu_flight);
+            # this session's stored profile is filled into its own copy
+            response = response.model_copy(deep=True)
+            remember_profile(session_id, response)
+            intent_requests = build_intent_requests(response, user_id=session_id, client_ip=client_ip)
+            logger.info(f"==========nlu_cost==========\n{nlu_metrics}")
         
         else:
             # Fallback if your Agno version doesn’t populate .parsed
             # Try to parse JSON; else just use raw content
             try:
-                nlu_json = json.loads(nlu_resp.content)
+                nlu_json = json.loads(response)
                 intent = nlu_json.get("intent")
             except Exception:
                 intent = None
         logger.info(f"intent: {intent}")
-        metrics.append({"nlu_agent_cost": nlu_resp.metrics.to_dict()})
+        metrics.append({"nlu_agent_cost": nlu_metrics})
     
 
-        # 2) Call sub-agent(s) based on intent
+        # 2) Call sub-agent(s) based on intent, all at once
         # NOTE: use the processed input, and only include #research if truly required.
-        budget_response: Optional[str] = None
-        stock_response: Optional[str] = None
-        research_response: Optional[str] = None
-
-        try:
-            if "budget" in intent:
-                # Call the budget tool over MCP
-                logger.info("Calling budget tool")
-                response.processed_input = budget_query
-                budget_call = await _budget_mcp.session.call_tool("create_budget", {"message": response})
-                budget_response = budget_call.structuredContent if hasattr(budget_call, "content") else str(budget_call)
-                logger.info(f"=============Budget tool completed=============\n{calculate_costs(budget_response['metrics'])}")
-                metrics.append({"budget_tool_cost": budget_response["metrics"]})
-             
-            if "stock" in intent:
-                logger.info("Calling stock tool")
-                response.processed_input = stock_query
-                stock_call = await _stock_mcp.session.call_tool("finance_analyzer", {"query": response})
-                stock_response = stock_call.structuredContent if hasattr(stock_call, "content") else str(stock_call)
-                logger.info(f"=============Stock tool complete=============\n{calculate_costs(stock_response['metrics'])}")
-                metrics.append({"stock_tool_cost": stock_response["metrics"]})
-
-            if "research" in intent:
-                logger.info("Calling research tool")
-                response.processed_input = research_query
-                research_call = await _research_mcp.session.call_tool("research", {"message": response})
-                research_response = research_call.structuredContent if hasattr(research_call, "content") else str(research_call)
-                logger.info(f"=============Research tool complete=============\n{calculate_costs(research_response['metrics'])}")
-                metrics.append({"research_tool_cost": research_response["metrics"]})
-        finally:
-            pass
-            
-
-        # 3) Build the writer prompt safely (only include non-empty sections)
-        sections = [
-            "Summarize the available sections below. Include tables for any budget section. "
-            "Only include sections that are provided.",
-            "\nPast conversation for context (only last few turns):\n"
-            + past_context
-        ]
-
-        if budget_response:
-            sections.append(f"\n=== budget_response ===\n{budget_response["content"]}")
-        if stock_response:
-            sections.append(f"\n=== stock_response ===\n{stock_response["content"]}")
-        if research_response:
-            sections.append(f"\n=== research_response ===\n{research_response["content"]}")
-
-        writer_prompt = "\n".join(sections)
-
-        # 4) Ask the writer to produce the final answer
-        logger.info("Writing final resposne")
-        writer_out: RunOutput = await writer.arun(writer_prompt)
-        
-        final_text = writer_out.content
+        # Under a deep queue, optional intents (research) are skipped to keep the rest fast
+        kept, skipped = scheduler.shed(intent_requests)
+        tool_inputs = {
+            name: intent_requests[name].model_dump(exclude_none=True) for name in kept
+        }
+        results = {
+            name: {"status": "skipped", "error": "skipped while the service is busy", "wall_time": 0.0, "intent": name}
+            for name in skipped
+        }
+        for name in skipped:
+            yield _progress(f"{name} skipped (busy)")
+
+        for name in tool_inputs:
+            yield _progress(f"{name} running")
+        async for name, result in dispatch_intents_iter(tool_inputs, priority):
+            results[name] = result
+            trace.add_span(name, result["wall_time"], result.get("metrics"), status=result["status"],
+                           cached=bool(result.get("cached")), coalesced=bool(result.get("coalesced")),
+                           slot_wait=result.get("slot_wait", 0.0),
+                           queue_wait=(result.get("metrics") or {}).get("queue_wait", 0.0),
+                           tier=tool_inputs.get(name, {}).get("tier"))
+            if result["status"] == "ok":
+                source = "cache hit" if result.get("cached") else "completed"
+                logger.info(f"============={name} tool {source} in {result['wall_time']:.2f}s=============\n{calculate_costs(result['metrics'])}")
+                metrics.append({f"{name}_tool_cost": {**result["metrics"], "wall_time": result["wall_time"]}})
+                yield _progress(f"{name} done")
+            else:
+                logger.warning(f"{name} tool {result['status']} after {result['wall_time']:.2f}s: {result['error']}")
+                metrics.append({f"{name}_tool_cost": {"wall_time": result["wall_time"], "failed": 1}})
+                yield _progress(f"{name} unavailable ({result['status']})")
+        # Keep the writer's section order stable regardless of finish order
+        results = {name: results[name] for name in intent_requests}
+
+        # 3) Compose: pass a single section through, stack independent ones locally,
+        # and only pay for the writer LLM when sections really need merging
+        composition = plan_composition(message, results)
+        logger.info(f"composition={composition}")
+        writer_started = time.perf_counter()
+        chunks = []
+        writer_metrics = {}
+        compaction_stats = {}
+        first_token_at = None
+        if composition != "writer":
+            text = compose_sections(results)
+            first_token_at = time.perf_counter() - started
+            chunks.append(text)
+            yield {"type": "token", "text": text}
+        else:
+            # Build the writer prompt safely (only include non-empty sections).
+            # Static instructions are in the writer's system prompt; the most
+            # volatile part, the conversation, goes last.
+            # Sections are compacted first: per-section token budgets, boilerplate
+            # and repeated headers dropped, tables and citations in compact form
+            compaction_started = time.perf_counter()
+            compacted, sources_block, had_boilerplate = compact_sections(results)
+            sections = []
+            for name, result in results.items():
+                if result["status"] == "ok":
+                    if result["content"]:
+                        sections.append(f"\n=== {name}_response ===\n{compacted[name]}")
+                else:
+                    # Partial result: let the writer tell the user this part is unavailable
+                    sections.append(f"\n=== {name}_response ===\n(The {name} service was unavailable ({result['status']}); mention that this part could not be answered.)")
+            if not results:
+                # No intent (greetings, small talk): the writer answers the message itself
+                sections.append(f"\n=== user_message ===\n{message}\n(No finance service was needed; reply briefly "
+                                "and mention you can help with budgets, stocks and financial research.)")
+            if sources_block:
+                sections.append(f"\n=== sources ===\n{sources_block}")
+            if had_boilerplate:
+                sections.append("\n(Risk disclaimers were removed from the sections; end with one short risk note.)")
+
+            sections.append("\nPast conversation for context (only last few turns):\n" + writer_history(past_context))
+            writer_prompt = "\n".join(sections)
+            # Estimated writer input with and without compaction
+            compaction_stats = {
+                "writer_input_tokens_raw": estimate_tokens(past_context) + sum(
+                    estimate_tokens(r["content"]) for r in results.values() if r["status"] == "ok" and r["content"]),
+                "writer_input_tokens_compacted": estimate_tokens(writer_prompt),
+            }
+            telemetry.incr("writer_prompt_tokens_raw", compaction_stats["writer_input_tokens_raw"])
+            telemetry.incr("writer_prompt_tokens_sent", compaction_stats["writer_input_tokens_compacted"])
+            trace.add_span("compaction", time.perf_counter() - compaction_started,
+                           tokens_before=compaction_stats["writer_input_tokens_raw"],
+                           tokens_after=compaction_stats["writer_input_tokens_compacted"])
+            logger.info(f"writer input ~{compaction_stats['writer_input_tokens_raw']} -> "
+                        f"~{compaction_stats['writer_input_tokens_compacted']} tokens after compaction")
+            # The writer gets the tier of the hardest section it has to merge; a reply
+            # with no sections is a short one
+            writer_settings = settings_for("writer", max_tier(
+                tool_inputs[name].get("tier") for name, result in results.items()
+                if result["status"] == "ok" and name in tool_inputs) if results else "light")
+            writer = writers[writer_settings["tier"]]
+
+            # 4) Stream the writer's answer. A request with an identical prompt already
+            # being written waits for that answer instead of paying for a second run.
+            logger.info("Writing final resposne")
+            yield _progress("Writing answer")
+            writer_key = flight_key(writer_prompt, writer_settings["tier"])
+            flight, leader = writer_flight.begin(writer_key)
+            shared = False
+            if not leader:
+                shared, outcome = await writer_flight.follow(flight)
+                if shared:
+                    text, leader_metrics = outcome
+                    first_token_at = time.perf_counter() - started
+                    chunks.append(text)
+                    writer_metrics = follower_metrics(leader_metrics)
+                    yield {"type": "token", "text": text}
+            if not shared:
+                try:
+                    async with scheduler.slot("writer", priority) as usage:
+                        async for event in writer.arun(writer_prompt, stream=True):
+                            kind = getattr(event, "event", None)
+                            if kind == "RunContent" and getattr(event, "content", None):
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter() - started
+                                chunks.append(event.content)
+                                yield {"type": "token", "text": event.content}
+                            elif kind == "RunCompleted" and getattr(event, "metrics", None):
+                                writer_metrics = with_cache_metrics({**event.metrics.to_dict(), **tier_metrics(writer_settings)})
+                        usage["tokens"] = writer_metrics.get("total_tokens")
+                except BaseException as e:
+                    if leader:
+                        if isinstance(e, Exception):
+                            writer_flight.finish(writer_key, flight, error=e)
+                        else:
+                            # Client went away mid-stream: followers write their own answer
+                            flight.cancel()
+                            writer_flight.finish(writer_key, flight)
+                    raise
+                if leader:
+                    writer_flight.finish(writer_key, flight, ("".join(chunks), writer_metrics))
+
+        final_text = "".join(chunks)
         
-        metrics.append({"writing_agent_cost": writer_out.metrics.to_dict()})
+        metrics.append({"writing_agent_cost": {
+            **writer_metrics,
+            **compaction_stats,
+            "writer_calls": int(composition == "writer" and not writer_metrics.get("coalesced")),
+            "writer_latency": time.perf_counter() - writer_started,
+            "pipeline_time_to_first_token": first_token_at or 0.0,
+        }})
+        trace.add_span("writer", time.perf_counter() - writer_started, writer_metrics, composition=composition,
+                       tier=writer_metrics.get("tier"), **compaction_stats)
+        traced = telemetry.record(trace)
         total_metric = total_metrics(metrics)
         
-        logger.info(f"Orchestration completed successfully\n====Total Cost====\n{calculate_costs(total_metric)}")
+        logger.info(f"Orchestration completed successfully in {time.perf_counter() - started:.2f}s "
+                    f"(first token after {first_token_at or 0.0:.2f}s, trace {traced['trace_id']}, "
+                    f"cost ${traced['cost']:.6f})\n====Total Tokens====\n{total_metric}")
         for metric in metrics:
             name = list(metric.keys())[0]
             logger.info(f"==========={name}===========\n {calculate_costs(metric[name])}")
         
 
-        conversation_memory.append({"user":message,"response": final_text})
-        return final_text
+        conversation_memory.append(session_id, message, final_text)
+        yield {"type": "done", "text": final_text, "metrics": metrics}
     except Exception as e:
         logger.error(f"Orchestration failed: {e}")
+        trace.add_span("orchestrator", time.perf_counter() - started, status="error", error=str(e)[:200])
+        telemetry.record(trace)
         raise
+
+async def orchestrator_agent(message: str, session_id: str = "default") -> str:
+    """Non-streaming entry point: run the pipeline and return only the final answer."""
+    final_text = None
+    async for event in orchestrator_stream(message, session_id):
+        if event["type"] == "done":
+            final_text = event["text"]
+    return final_text
+
 if __name__ == '__main__':
     userInput = input()
    
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+# Seconds a cached answer stays valid, per intent.
+# Quotes move quickly, budgets depend on the profile, research is mostly evergreen.
+INTENT_TTLS = {
+    "stock": int(os.getenv("CACHE_TTL_STOCK", 300)),
+    "budget": int(os.getenv("CACHE_TTL_BUDGET", 6 * 3600)),
+    "research": int(os.getenv("CACHE_TTL_RESEARCH", 7 * 24 * 3600)),
+}
+# LRU size limit per intent
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 500))
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite")
+# Hits record their access time in memory; written in one batch at this many (or on the next put)
+TOUCH_BATCH = int(os.getenv("CACHE_TOUCH_BATCH", 32))
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "is", "are", "what", "whats",
+    "me", "my", "i", "please", "can", "you", "give", "show", "tell", "about", "with", "its",
+}
+
+def normalize_query(text: str) -> str:
+    """
+    Reduce a query to a canonical form so near-identical questions share a key:
+    lowercase, punctuation and filler words dropped. Word order is kept, so
+    "convert 100 USD to EUR" and "convert 100 EUR to USD" stay different;
+    "What is the AAPL P/E?" and "aapl p/e please" both become "aapl p/e".
+    """
+    text = text.lower().replace("’", "'").replace("'", "")
+    words = (w.strip("./") for w in re.findall(r"[\w$%./]+", text))
+    return " ".join(w for w in words if w and w not in _STOPWORDS)
+
+class ResponseCache:
+    """
+    SQLite backed cache of sub-agent answers, keyed by intent + normalized query
+    + the profile fields sent with the request. Survives restarts; each intent
+    has its own TTL and is trimmed to MAX_ENTRIES least recently used rows.
+    aget/aput run the SQLite work in a thread, off the event loop.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttls: dict = INTENT_TTLS, max_entries: int = MAX_ENTRIES):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, intent TEXT, created_at REAL, accessed_at REAL,"
+            " content TEXT, metrics TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (intent, accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(intent: str, request: dict) -> str:
+        profile = {k: str(v).strip().lower() for k, v in sorted(request.items()) if k != "processed_input"}
+        raw = json.dumps([intent, normalize_query(request.get("processed_input", "")), profile])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, intent: str, request: dict) -> Optional[dict]:
+        """Return {"content", "metrics"} for a fresh entry, else None."""
+        key = self.make_key(intent, request)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created_at, content, metrics FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[0] <= self.ttls.get(intent, 0):
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._flush_touched()
+                    self._db.commit()
+                self.stats[intent]["hits"] += 1
+                return {"content": row[1], "metrics": json.loads(row[2])}
+            if row:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            self.stats[intent]["misses"] += 1
+            return None
+
+    def put(self, intent: str, request: dict, content: str, metrics: dict):
+        if self.ttls.get(intent, 0) <= 0:
+            return
+        key = self.make_key(intent, request)
+        now = time.time()
+        with self._lock:
+            # Access times first, so the LRU trim below sees recent hits
+            self._flush_touched()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, intent, now, now, content, json.dumps(metrics)),
+            )
+            # LRU trim for this intent
+            self._db.execute(
+                "DELETE FROM responses WHERE intent = ? AND key NOT IN ("
+                " SELECT key FROM responses WHERE intent = ? ORDER BY accessed_at DESC LIMIT ?)",
+                (intent, intent, self.max_entries),
+            )
+            self._db.commit()
+
+    def _flush_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._db.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                 [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    async def aget(self, intent: str, request: dict) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, intent, request)
+
+    async def aput(self, intent: str, request: dict, content: str, metrics: dict):
+        await asyncio.to_thread(self.put, intent, request, content, metrics)
+
+def cache_hit_metrics(cached_metrics: dict) -> dict:
+    """
+    Metrics recorded for a cache hit: no tokens spent, and the tokens the original
+    run spent reported as saved_* so calculate_costs can price the savings.
+    """
+    saved = {
+        f"saved_{name}": cached_metrics.get(name, 0)
+        for name in ("input_tokens", "output_tokens")
+    }
+    return {"cache_hits": 1, "cache_misses": 0, "model": cached_metrics.get("model"), **saved}
@@ -1,8 +1,9 @@
 # app.py
-import os, asyncio, json
+import os, asyncio, json, atexit
 import gradio as gr
 
-from orchestrator_agent import orchestrator_agent, ensure_mcp, close_tools  # import your functions
+from orchestrator_agent import orchestrator_stream, ensure_mcp, close_tools_at_exit  # import your functions
+from telemetry import telemetry, METRICS_PORT
 
 # (Windows often benefits from this to avoid selector quirks)
 if os.name == "nt":
@@ -17,18 +18,26 @@ async def on_start():
     # Connect MCP tools once, in Gradio's event loop
     await ensure_mcp()
 
-async def on_shutdown():
-    # Optional: clean shutdown. If this ever causes loop issues, you can skip closing.
-    await close_tools()
-
-async def chat_respond(message: str, history: list[str]):
+async def chat_respond(message: str, history: list[str], request: gr.Request):
     """
-    Gradio will pass (message, history). We only need message.
-    Return a string for the chatbot to display.
+    Gradio will pass (message, history, request). We only need message and the
+    session hash, which keys this user's memory.
+    Yields the progress so far, then the answer as the writer streams it.
     """
     # Call your orchestrator; make sure it does NOT close tools per request
-    reply = await orchestrator_agent(message)
-    return reply
+    session_id = getattr(request, "session_hash", None) or "default"
+    progress = []
+    answer = ""
+    client_ip = getattr(getattr(request, "client", None), "host", None)
+    async for event in orchestrator_stream(message, session_id=session_id, client_ip=client_ip):
+        if event["type"] == "progress":
+            progress.append(f"_{event['text']}…_")
+            yield "\n\n".join(progress)
+        elif event["type"] == "token":
+            answer += event["text"]
+            yield answer
+        elif event["type"] == "done" and event["text"] != answer:
+            yield event["text"]
 
 with gr.Blocks(title="Finance Seer") as demo:
     gr.Markdown("## 💸 Finance Seer\nAsk for a budget or stock help. I’ll route to the right agent.")
@@ -40,11 +49,15 @@ with gr.Blocks(title="Finance Seer") as demo:
         submit_btn=None,
         stop_btn=None,
     )
-    # Connect/disconnect hooks
+    # Connect hook; the pools are shared by every browser session, so they are
+    # closed once at process exit, not when a session leaves
     demo.load(on_start, queue=False)    # async supported
-    demo.unload(on_shutdown)            # async supported in recent Gradio
+    atexit.register(close_tools_at_exit)
 
 # Serve
 if __name__ == "__main__":
+    # Prometheus text at :METRICS_PORT/metrics, p50/p95 JSON at /summary (METRICS_PORT=0 disables)
+    if METRICS_PORT:
+        telemetry.serve(METRICS_PORT)
     # queue() enables concurrency + streaming; launch binds the server
     demo.queue().launch(server_name="0.0.0.0", server_port=7860, show_error=True)
\ No newline at end of file
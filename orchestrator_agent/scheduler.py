@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telemetry import telemetry
+
+# Requests running the pipeline at once; the rest wait in priority order
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 16))
+# Waiting requests beyond this are turned away immediately
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", 64))
+# Sub-agent calls in flight per intent; stock runs are the slowest
+INTENT_CONCURRENCY = {
+    "budget": int(os.getenv("BUDGET_MAX_CONCURRENCY", 8)),
+    "stock": int(os.getenv("STOCK_MAX_CONCURRENCY", 4)),
+    "research": int(os.getenv("RESEARCH_MAX_CONCURRENCY", 6)),
+    "nlu": int(os.getenv("NLU_MAX_CONCURRENCY", 16)),
+    "writer": int(os.getenv("WRITER_MAX_CONCURRENCY", 8)),
+}
+# Longest a call may wait for its slot before it is given up
+MAX_QUEUE_WAIT = float(os.getenv("SCHEDULER_MAX_QUEUE_WAIT", 30))
+# OpenAI account budget shared by every LLM call this process starts; 0 disables the limit
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", 500))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", 200_000))
+# Rough tokens per call, charged up front and corrected once the real usage is known
+ESTIMATED_TOKENS = {"nlu": 800, "writer": 3000, "budget": 3000, "stock": 6000, "research": 5000}
+# OpenAI requests per call, charged to the RPM budget: a sub-agent run is a model call
+# per tool round trip (market data, web search), not one
+ESTIMATED_CALLS = {
+    "nlu": 1,
+    "writer": 1,
+    "budget": int(os.getenv("BUDGET_ESTIMATED_CALLS", 2)),
+    "stock": int(os.getenv("STOCK_ESTIMATED_CALLS", 4)),
+    "research": int(os.getenv("RESEARCH_ESTIMATED_CALLS", 3)),
+}
+# Queries this short with a single intent go ahead of long multi-intent ones
+SHORT_QUERY_CHARS = int(os.getenv("SHORT_QUERY_CHARS", 160))
+# With this many requests waiting, optional intents are skipped to protect the rest
+DEGRADE_QUEUE_DEPTH = int(os.getenv("DEGRADE_QUEUE_DEPTH", 8))
+OPTIONAL_INTENTS = tuple(i for i in os.getenv("OPTIONAL_INTENTS", "research").split(",") if i)
+
+class Overloaded(RuntimeError):
+    """The queue is full, or a slot didn't free up within MAX_QUEUE_WAIT."""
+
+class TokenBucket:
+    """Refills at per_minute/60 per second up to one minute's worth; callers wait for enough tokens."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount: float):
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        # One waiter at a time, so a large request isn't starved by a stream of small ones
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference between estimate and actual usage."""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class PrioritySemaphore:
+    """A semaphore whose waiters are woken lowest priority number first, FIFO within a priority."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for *_, f in self._waiters if not f.done())
+
+    def _wake(self):
+        while self._waiters and self.active < self.limit:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    async def acquire(self, priority: int = 1, timeout: Optional[float] = None) -> float:
+        """Take a slot and return how long it took."""
+        started = time.perf_counter()
+        if self.active < self.limit and not self.depth:
+            self.active += 1
+            return 0.0
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we gave up: hand it on
+                self.release()
+            raise
+        return time.perf_counter() - started
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+class Scheduler:
+    """
+    Admission control and per-stage limits for the orchestrator.
+
+    admit() bounds whole requests: short single-intent queries are let in first,
+    and once MAX_QUEUED_REQUESTS are waiting new ones are rejected right away.
+    slot() bounds each LLM-backed call per intent and charges the OpenAI RPM/TPM
+    token buckets. Every wait is reported to telemetry as queue_wait_<name>.
+    """
+
+    def __init__(self):
+        self.admission = PrioritySemaphore("admission", MAX_CONCURRENT_REQUESTS)
+        self.limits: Dict[str, PrioritySemaphore] = {
+            name: PrioritySemaphore(name, limit) for name, limit in INTENT_CONCURRENCY.items()
+        }
+        self.rpm = TokenBucket(OPENAI_RPM)
+        self.tpm = TokenBucket(OPENAI_TPM)
+
+    @staticmethod
+    def priority(message: str, intents: Optional[Iterable[str]] = None) -> int:
+        """0 for short single-intent queries, 1 for everything else."""
+        intents = list(intents) if intents is not None else []
+        return 0 if len(message) <= SHORT_QUERY_CHARS and len(intents) <= 1 else 1
+
+    def _publish(self):
+        telemetry.set_gauge("queue_depth_admission", self.admission.depth)
+        for name, sem in self.limits.items():
+            telemetry.set_gauge(f"queue_depth_{name}", sem.depth)
+
+    @asynccontextmanager
+    async def admit(self, priority: int = 1):
+        """Yields the time spent waiting; raises Overloaded when the queue is full."""
+        if self.admission.active >= self.admission.limit and self.admission.depth >= MAX_QUEUED_REQUESTS:
+            telemetry.incr("requests_rejected")
+            raise Overloaded(f"{self.admission.depth} requests already waiting")
+        waited = await self._acquire(self.admission, priority)
+        telemetry.observe_wait("admission", waited)
+        try:
+            yield waited
+        finally:
+            self.admission.release()
+            self._publish()
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: int = 1):
+        """
+        One LLM-backed call for `name` (an intent, "nlu" or "writer"), charged
+        ESTIMATED_CALLS[name] requests up front. Yields a dict; set its "tokens" to
+        the real usage so the TPM bucket is corrected.
+        """
+        sem = self.limits[name]
+        waited = await self._acquire(sem, priority)
+        estimate = ESTIMATED_TOKENS.get(name, 2000)
+        # One bucket after the other; whatever was taken is refunded if the call gives up
+        taken = []
+        try:
+            started = time.perf_counter()
+            deadline = started + max(MAX_QUEUE_WAIT - waited, 0.1)
+            for bucket, amount in ((self.rpm, ESTIMATED_CALLS.get(name, 1)), (self.tpm, estimate)):
+                await asyncio.wait_for(bucket.take(amount), timeout=max(deadline - time.perf_counter(), 0.01))
+                taken.append((bucket, min(amount, bucket.capacity)))
+            waited += time.perf_counter() - started
+        except asyncio.TimeoutError:
+            for bucket, amount in taken:
+                bucket.adjust(-amount)
+            sem.release()
+            telemetry.incr(f"queue_timeouts_{name}")
+            raise Overloaded(f"OpenAI rate budget exhausted for {name}")
+        except BaseException:
+            for bucket, amount in taken:
+                bucket.adjust(-amount)
+            sem.release()
+            raise
+        telemetry.observe_wait(name, waited)
+        usage = {"queue_wait": waited, "tokens": None}
+        try:
+            yield usage
+        finally:
+            if usage["tokens"] is not None:
+                self.tpm.adjust(usage["tokens"] - estimate)
+            sem.release()
+            self._publish()
+
+    async def _acquire(self, sem: PrioritySemaphore, priority: int) -> float:
+        self._publish()
+        try:
+            waited = await sem.acquire(priority, timeout=MAX_QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            telemetry.incr(f"queue_timeouts_{sem.name}")
+            raise Overloaded(f"no {sem.name} slot within {MAX_QUEUE_WAIT:.0f}s")
+        return waited
+
+    def shed(self, intents: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Degraded mode: under a deep queue, drop optional intents (research by default)
+        when the request has other intents to answer. Returns (kept, skipped).
+        """
+        intents = list(intents)
+        busy = self.admission.depth >= DEGRADE_QUEUE_DEPTH
+        skipped = [i for i in intents if busy and i in OPTIONAL_INTENTS and len(intents) > 1]
+        if skipped:
+            telemetry.incr("intents_shed", len(skipped))
+        return [i for i in intents if i not in skipped], skipped
+
+scheduler = Scheduler()
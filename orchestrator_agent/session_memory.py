@@ -0,0 +1,107 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from util import estimate_tokens, truncate_tokens
+
+# Token budget for the whole history block pasted into a prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 600))
+# Budget for one turn's summary (user message + answer)
+TURN_TOKEN_BUDGET = int(os.getenv("TURN_TOKEN_BUDGET", 120))
+# Sessions untouched for this many seconds are dropped
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", 1800))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 1000))
+
+def summarize_answer(text: str, max_tokens: int) -> str:
+    """
+    Cheap extractive summary of a markdown answer: headings and the first sentence
+    of each paragraph, without tables, code or emoji-heavy bullets, cut to max_tokens.
+    """
+    text = re.sub(r"```.*?```", " ", text or "", flags=re.DOTALL)
+    picked = []
+    for block in re.split(r"\n\s*\n", text):
+        lines = [l.strip() for l in block.strip().splitlines() if l.strip() and not l.strip().startswith("|")]
+        if not lines:
+            continue
+        first = re.sub(r"^[#>*\-\d.\s]+", "", lines[0]).strip()
+        if not first:
+            continue
+        sentence = re.split(r"(?<=[.!?])\s", first, maxsplit=1)[0]
+        picked.append(sentence)
+    return truncate_tokens("; ".join(picked), max_tokens)
+
+class _Session:
+    def __init__(self):
+        self.turns = deque()  # (user, answer summary), oldest first
+        self.earlier = ""     # rolled-up user topics of turns that no longer fit
+        self.touched = time.monotonic()
+
+class SessionHistory:
+    """
+    Conversation history scoped to one Gradio session.
+
+    Each turn is stored as a short summary instead of the raw answer. When the
+    session goes over its token budget the oldest turns are folded into a single
+    'Earlier' line of topics, so the prompt size per turn stays bounded however
+    long a conversation runs.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, turn_budget: int = TURN_TOKEN_BUDGET,
+                 idle_ttl: int = SESSION_IDLE_TTL, max_sessions: int = MAX_SESSIONS):
+        self.token_budget = token_budget
+        self.turn_budget = turn_budget
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> _Session:
+        # Caller holds the lock
+        self._evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        session.touched = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        # Sessions are kept in last-touched order, so stop at the first live one
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.touched < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+
+    @staticmethod
+    def _format_turn(user: str, answer: str) -> str:
+        return f"User: {user}\nAssistant: {answer}"
+
+    def context(self, session_id: str) -> str:
+        """History for this session, most recent last, within the token budget."""
+        with self._lock:
+            session = self._session(session_id)
+            parts = [f"Earlier the user asked about: {session.earlier}"] if session.earlier else []
+            parts += [self._format_turn(u, a) for u, a in session.turns]
+            return "\n".join(parts)
+
+    def append(self, session_id: str, user: str, answer: str):
+        with self._lock:
+            session = self._session(session_id)
+            user = truncate_tokens(user, self.turn_budget // 3)
+            session.turns.append((user, summarize_answer(answer, self.turn_budget - estimate_tokens(user))))
+            # Roll the oldest turns up until everything fits
+            while len(session.turns) > 1 and self._tokens(session) > self.token_budget:
+                old_user, _ = session.turns.popleft()
+                earlier = f"{session.earlier}; {old_user}" if session.earlier else old_user
+                session.earlier = truncate_tokens(earlier, self.turn_budget, keep="end")
+
+    def _tokens(self, session: _Session) -> int:
+        return estimate_tokens(session.earlier) + sum(
+            estimate_tokens(self._format_turn(u, a)) for u, a in session.turns
+        )
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telemetry import telemetry
+
+# Longest a follower waits on someone else's run before starting its own
+SINGLE_FLIGHT_MAX_WAIT = float(os.getenv("SINGLE_FLIGHT_MAX_WAIT", 60))
+
+def flight_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+class SingleFlight:
+    """
+    Concurrent requests for the same key share one run: the first caller (the
+    leader) does the work, later callers (followers) attach to its future.
+
+    Followers wait at most max_wait. If the leader is slower than that, or its
+    request is cancelled (client went away), the follower runs the work itself.
+    Errors from the leader are shared like results. Counters go to telemetry as
+    single_flight_<name>_{leaders,coalesced,timeouts}.
+    """
+
+    def __init__(self, name: str, max_wait: float = SINGLE_FLIGHT_MAX_WAIT):
+        self.name = name
+        self.max_wait = max_wait
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def begin(self, key: str) -> Tuple[asyncio.Future, bool]:
+        """(future, is_leader). The leader must call finish() for that future."""
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            return future, False
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        telemetry.incr(f"single_flight_{self.name}_leaders")
+        return future, True
+
+    def finish(self, key: str, future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Mark retrieved so an unwatched failure doesn't log "exception never retrieved"
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def follow(self, future: asyncio.Future, max_wait: Optional[float] = None) -> Tuple[bool, Any]:
+        """
+        (True, leader's result) or (False, None) when the caller should run the
+        work itself: the wait timed out or the leader was cancelled.
+        """
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=max_wait or self.max_wait)
+        except asyncio.TimeoutError:
+            telemetry.incr(f"single_flight_{self.name}_timeouts")
+            return False, None
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # This caller was cancelled, not the leader
+                raise
+            return False, None
+        telemetry.incr(f"single_flight_{self.name}_coalesced")
+        return True, result
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]], max_wait: Optional[float] = None) -> Tuple[Any, bool]:
+        """(result, shared): fn's result, computed once per key across concurrent callers."""
+        future, leader = self.begin(key)
+        if not leader:
+            shared, result = await self.follow(future, max_wait)
+            if shared:
+                return result, True
+            return await fn(), False
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Let followers fall back to their own run instead of failing with us
+            future.cancel()
+            self.finish(key, future)
+            raise
+        except Exception as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result, False
+
+def follower_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Metrics for a request that reused another request's run: nothing spent here,
+    and what the run cost reported as saved_* so calculate_costs prices it.
+    """
+    metrics = metrics or {}
+    return {
+        "coalesced": 1,
+        "model": metrics.get("model"),
+        "saved_input_tokens": metrics.get("input_tokens", 0) or 0,
+        "saved_output_tokens": metrics.get("output_tokens", 0) or 0,
+    }
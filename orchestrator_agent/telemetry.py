@@ -0,0 +1,333 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# USD per 1M tokens. Override or extend with a JSON file at PRICING_FILE:
+# {"gpt-5-nano": {"input": 0.05, "cached_input": 0.005, "output": 0.40}, ...}
+DEFAULT_PRICING = {
+    "gpt-5-nano": {"input": 0.05, "cached_input": 0.005, "output": 0.40},
+    "gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.00},
+    "gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "o4-mini": {"input": 1.10, "cached_input": 0.275, "output": 4.40},
+}
+DEFAULT_MODEL = os.getenv("DEFAULT_PRICING_MODEL", "gpt-5-nano")
+TELEMETRY_JSONL = os.getenv("TELEMETRY_JSONL", "traces.jsonl")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+# Samples kept per stage for p50/p95
+WINDOW = int(os.getenv("TELEMETRY_WINDOW", 1000))
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 240)
+COST_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+
+def load_pricing(path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    pricing = {model: dict(prices) for model, prices in DEFAULT_PRICING.items()}
+    path = path or os.getenv("PRICING_FILE")
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            for model, prices in json.load(f).items():
+                pricing.setdefault(model, {}).update(prices)
+    return pricing
+
+PRICING = load_pricing()
+# Models priced at DEFAULT_MODEL rates because they have no entry; warned about once each
+_unpriced = set()
+
+def prices_for(model: Optional[str]) -> Dict[str, float]:
+    """Prices for a model id; dated ids (gpt-5-nano-2025-08-07) fall back to their base name."""
+    model = model or DEFAULT_MODEL
+    if model in PRICING:
+        return PRICING[model]
+    for known in sorted(PRICING, key=len, reverse=True):
+        if model.startswith(known):
+            return PRICING[known]
+    if model not in _unpriced:
+        _unpriced.add(model)
+        print(f"[telemetry] no pricing for {model}; using {DEFAULT_MODEL} rates (add it to PRICING_FILE)")
+    return PRICING[DEFAULT_MODEL]
+
+def cached_tokens(metrics: Dict[str, Any]) -> float:
+    # Agno reports cache hits as cache_read_tokens; older versions used cached_tokens
+    return metrics.get("cached_input_tokens") or metrics.get("cache_read_tokens") or metrics.get("cached_tokens") or 0
+
+def token_cost(metrics: Dict[str, Any], model: Optional[str] = None) -> Dict[str, float]:
+    """
+    Dollar cost of one model call's token counts.
+    Cached input is billed at the cached rate and the rest of the input at the
+    input rate. Reasoning tokens are already part of output_tokens, so they are
+    billed at the output rate and not counted again.
+    """
+    prices = prices_for(model or metrics.get("model"))
+    input_tokens = metrics.get("input_tokens", 0) or 0
+    cached = min(cached_tokens(metrics), input_tokens)
+    output_tokens = metrics.get("output_tokens", 0) or 0
+    input_cost = ((input_tokens - cached) * prices["input"] + cached * prices["cached_input"]) / 1_000_000
+    output_cost = output_tokens * prices["output"] / 1_000_000
+    return {
+        "input": input_cost,
+        "cached_input": cached * prices["cached_input"] / 1_000_000,
+        "output": output_cost,
+        "reasoning": (metrics.get("reasoning_tokens", 0) or 0) * prices["output"] / 1_000_000,
+        "total": input_cost + output_cost,
+    }
+
+class Trace:
+    """One orchestration: a span per stage (NLU, each MCP call, writer)."""
+
+    def __init__(self, session_id: str = "default", message: str = ""):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.message = message[:200]
+        self.started = time.time()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add_span(self, stage: str, latency: float, metrics: Optional[Dict[str, Any]] = None,
+                 model: Optional[str] = None, status: str = "ok", **attributes):
+        metrics = metrics or {}
+        model = model or metrics.get("model")
+        spent = bool(metrics.get("input_tokens") or metrics.get("output_tokens"))
+        self.spans.append({
+            "stage": stage,
+            "latency": round(latency, 4),
+            "status": status,
+            "model": model if spent else None,
+            "input_tokens": metrics.get("input_tokens", 0) or 0,
+            "cached_input_tokens": cached_tokens(metrics),
+            "output_tokens": metrics.get("output_tokens", 0) or 0,
+            "reasoning_tokens": metrics.get("reasoning_tokens", 0) or 0,
+            "cost": round(token_cost(metrics, model)["total"], 8) if spent else 0.0,
+            **attributes,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "message": self.message,
+            "started": self.started,
+            "latency": round(time.time() - self.started, 4),
+            "cost": round(sum(s["cost"] for s in self.spans), 8),
+            "spans": self.spans,
+        }
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.window = deque(maxlen=WINDOW)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.window.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class Telemetry:
+    """
+    Aggregates finished traces into per-stage latency/cost histograms and token
+    counters, appends every trace to a JSONL file, and renders Prometheus text.
+    The file is written by a background thread, so record() never blocks the event loop.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = TELEMETRY_JSONL):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self.latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self.cost = defaultdict(lambda: _Histogram(COST_BUCKETS))
+        self.tokens = defaultdict(float)   # (stage, model, kind) -> count
+        self.spend = defaultdict(float)    # (stage, model) -> USD
+        self.errors = defaultdict(int)     # (stage, status) -> count
+        self.tiers = defaultdict(int)      # (stage, model tier) -> calls
+        self.counters = defaultdict(float) # free-form counters, e.g. coalesced requests
+        self.gauges = {}                   # current values, e.g. queue depth
+        self.queue_wait = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, trace: Trace) -> Dict[str, Any]:
+        data = trace.to_dict()
+        with self._lock:
+            self.latency["request"].observe(data["latency"])
+            self.cost["request"].observe(data["cost"])
+            for span in data["spans"]:
+                stage, model = span["stage"], span["model"] or "none"
+                self.latency[stage].observe(span["latency"])
+                self.cost[stage].observe(span["cost"])
+                self.spend[(stage, model)] += span["cost"]
+                for kind in ("input_tokens", "cached_input_tokens", "output_tokens", "reasoning_tokens"):
+                    self.tokens[(stage, model, kind)] += span[kind]
+                if span["status"] != "ok":
+                    self.errors[(stage, span["status"])] += 1
+                if span.get("tier"):
+                    self.tiers[(stage, span["tier"])] += 1
+            if self.jsonl_path:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_jsonl, name="telemetry-jsonl", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush)
+                self._pending.put(json.dumps(data, ensure_ascii=False) + "\n")
+        return data
+
+    def _write_jsonl(self):
+        # Appends whatever has queued up since the last write in one go
+        while True:
+            lines = [self._pending.get()]
+            while True:
+                try:
+                    lines.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.jsonl_path, "a") as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                print(f"[telemetry] could not write {self.jsonl_path}: {e}")
+            finally:
+                for _ in lines:
+                    self._pending.task_done()
+
+    def flush(self):
+        """Wait until every recorded trace is in the JSONL file."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _cache_hit_ratio(self, stage: str) -> float:
+        # Share of this stage's input tokens served from the provider's prompt cache
+        sums = defaultdict(float)
+        for (s, _, kind), value in self.tokens.items():
+            if s == stage:
+                sums[kind] += value
+        return sums["cached_input_tokens"] / sums["input_tokens"] if sums["input_tokens"] else 0.0
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe_wait(self, name: str, seconds: float):
+        """Time a request or call spent waiting for a scheduler slot."""
+        with self._lock:
+            self.queue_wait[name].observe(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95 latency, mean cost and prompt cache hit ratio per stage over the recent window."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": hist.count,
+                    "p50": hist.quantile(0.50),
+                    "p95": hist.quantile(0.95),
+                    "mean_cost": self.cost[stage].total / max(self.cost[stage].count, 1),
+                    "prompt_cache_hit_ratio": self._cache_hit_ratio(stage),
+                }
+                for stage, hist in self.latency.items()
+            } | {
+                f"queue_wait_{name}": {
+                    "count": hist.count,
+                    "p50": hist.quantile(0.50),
+                    "p95": hist.quantile(0.95),
+                }
+                for name, hist in self.queue_wait.items()
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for metric, hists, help_text in (
+                ("finance_stage_latency_seconds", self.latency, "Latency per pipeline stage"),
+                ("finance_stage_cost_usd", self.cost, "Cost per pipeline stage call"),
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for stage, hist in hists.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {hist.total}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {hist.count}')
+            lines += ["# HELP finance_stage_latency_quantile_seconds Recent latency quantiles per stage",
+                      "# TYPE finance_stage_latency_quantile_seconds gauge"]
+            for stage, hist in self.latency.items():
+                for q in (0.5, 0.95):
+                    lines.append(f'finance_stage_latency_quantile_seconds{{stage="{stage}",quantile="{q}"}} {hist.quantile(q)}')
+            lines += ["# HELP finance_tokens_total Tokens per stage, model and kind", "# TYPE finance_tokens_total counter"]
+            for (stage, model, kind), value in self.tokens.items():
+                lines.append(f'finance_tokens_total{{stage="{stage}",model="{model}",kind="{kind}"}} {value}')
+            lines += ["# HELP finance_spend_usd_total Spend per stage and model", "# TYPE finance_spend_usd_total counter"]
+            for (stage, model), value in self.spend.items():
+                lines.append(f'finance_spend_usd_total{{stage="{stage}",model="{model}"}} {value}')
+            lines += ["# HELP finance_model_tier_calls_total Calls per stage and model tier", "# TYPE finance_model_tier_calls_total counter"]
+            for (stage, tier), value in self.tiers.items():
+                lines.append(f'finance_model_tier_calls_total{{stage="{stage}",tier="{tier}"}} {value}')
+            lines += ["# HELP finance_prompt_cache_hit_ratio Cached share of input tokens per stage",
+                      "# TYPE finance_prompt_cache_hit_ratio gauge"]
+            for stage in self.latency:
+                if stage != "request":
+                    lines.append(f'finance_prompt_cache_hit_ratio{{stage="{stage}"}} {self._cache_hit_ratio(stage)}')
+            lines += ["# HELP finance_stage_errors_total Failed or timed out stage calls", "# TYPE finance_stage_errors_total counter"]
+            for (stage, status), value in self.errors.items():
+                lines.append(f'finance_stage_errors_total{{stage="{stage}",status="{status}"}} {value}')
+            lines += ["# HELP finance_queue_wait_seconds Time spent waiting for a scheduler slot",
+                      "# TYPE finance_queue_wait_seconds histogram"]
+            for name, hist in self.queue_wait.items():
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'finance_queue_wait_seconds_bucket{{queue="{name}",le="{bound}"}} {count}')
+                lines.append(f'finance_queue_wait_seconds_bucket{{queue="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'finance_queue_wait_seconds_sum{{queue="{name}"}} {hist.total}')
+                lines.append(f'finance_queue_wait_seconds_count{{queue="{name}"}} {hist.count}')
+            for name, value in self.counters.items():
+                name = name if name.endswith("_total") else f"{name}_total"
+                lines += [f"# TYPE finance_{name} counter", f"finance_{name} {value}"]
+            for name, value in self.gauges.items():
+                lines += [f"# TYPE finance_{name} gauge", f"finance_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT) -> ThreadingHTTPServer:
+        """Expose /metrics (Prometheus text) and /summary (JSON) on a background thread."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body, kind = telemetry.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/summary"):
+                    body, kind = json.dumps(telemetry.summary()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+telemetry = Telemetry()
@@ -1,13 +1,17 @@
 from collections import defaultdict
 import logging
+import math
 from agno.utils.log import configure_agno_logging
+from telemetry import token_cost, cached_tokens
+from mcp_pool import close_all, close_all_blocking
 
 def total_metrics(metrics_list):
     """
     Take a list of dictionaries like:
     [{'nlu_agent_metrics': {...}}, {'research_tool_metrics': {...}}]
     and return a single dict summing all like keys (input_tokens, output_tokens…)
-    across all agents.
+    across all agents. Agents may run on different models, so 'cost' is the sum
+    of each agent's cost at its own model's prices.
     """
     totals = defaultdict(float)
 
@@ -16,56 +20,75 @@ def total_metrics(metrics_list):
             for metric, value in inner_dict.items():
                 if isinstance(value, (int, float)):
                     totals[metric] += value
+            if inner_dict.get("input_tokens") or inner_dict.get("output_tokens"):
+                totals["cost"] += token_cost(inner_dict)["total"]
 
     return dict(totals)
 
-def calculate_costs(tokens_dict):
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for prompt budgets."""
+    return math.ceil(len(text or "") / 4)
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "start") -> str:
+    """Cut text to about max_tokens, keeping the start (default) or the end."""
+    text = text or ""
+    max_chars = max(max_tokens, 0) * 4
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 1:
+        # No room for any text next to the "…" marker
+        return "…"[:max_chars]
+    if keep == "end":
+        return "…" + text[-(max_chars - 1):]
+    return text[:max_chars - 1].rstrip() + "…"
+
+def calculate_costs(tokens_dict, model=None):
     """
-    Calculates the cost for each token type based on gpt-5-nano pricing.
-    reasoning_tokens are treated as cached input tokens.
-    Returns a dictionary with the same keys but costs instead of token amounts.
+    Calculates the dollar cost of a metrics dict using the pricing table in telemetry.py.
+    The model is taken from the argument, then tokens_dict['model'], then DEFAULT_PRICING_MODEL;
+    pass each agent's own metrics, since tiers run different models.
+    Cached input tokens are billed at the cached rate; 'cached_input_tokens' shows their
+    share of the input cost, and 'reasoning_tokens' the reasoning share of the output cost.
+    Returns a dictionary with the same keys but costs instead of token amounts; the
+    cached token count itself is reported separately as 'cached_input_token_count'.
     """
-    # Prices per 1M tokens
-    price_input = 0.050 / 1_000_000       # normal input tokens
-    price_cached_input = 0.005 / 1_000_000  # cached input (reasoning tokens)
-    price_output = 0.400 / 1_000_000       # output tokens
-    input_tokens = tokens_dict.get('input_tokens', 0.0)
-    output_tokens = tokens_dict.get('output_tokens', 0.0)
-    reasoning_tokens = tokens_dict.get('reasoning_tokens', 0.0)
-    total_tokens = tokens_dict.get('total_tokens', 0.0)
+    costs = token_cost(tokens_dict, model)
+    # Tokens a response-cache hit did not have to spend
+    saved = token_cost({
+        'model': tokens_dict.get('model'),
+        'input_tokens': tokens_dict.get('saved_input_tokens', 0.0),
+        'output_tokens': tokens_dict.get('saved_output_tokens', 0.0),
+    }, model)['total']
 
     return {
-        'input_tokens': input_tokens * price_input,
-        'output_tokens': output_tokens * price_output,
-        'total_tokens': total_tokens * price_input,  # or recompute sum if you want
-        'reasoning_tokens': reasoning_tokens * price_cached_input,
-        'duration': tokens_dict.get('duration')
+        'input_tokens': costs['input'],
+        'output_tokens': costs['output'],
+        'total_tokens': costs['total'],
+        'reasoning_tokens': costs['reasoning'],
+        'cached_input_tokens': costs['cached_input'],
+        'cached_input_token_count': cached_tokens(tokens_dict),
+        'duration': tokens_dict.get('duration'),
+        'cache_hits': tokens_dict.get('cache_hits', 0),
+        'cache_misses': tokens_dict.get('cache_misses', 0),
+        'saved': saved,
+        'writer_calls': tokens_dict.get('writer_calls'),
+        'writer_latency': tokens_dict.get('writer_latency'),
+        'model': tokens_dict.get('model'),
+        'tier': tokens_dict.get('tier'),
     }
 
 
 
-async def _safe_close(tool, name: str):
-    # Close only if a session exists; swallow errors so others still close
-    try:
-        if tool is not None and getattr(tool, "session", None):
-            await tool.close()
-    except Exception as e:
-        print(f"[close_tools] Warning: failed to close {name}: {e}")
-
 async def close_tools():
     """
-    Close MCP tool sessions in reverse order of connection.
-    Keep this in the SAME task/loop that connected them.
+    Drain the MCP session pools: stop new calls, let in-flight ones finish,
+    then close every session from the task that opened it.
     """
-    # tools may not all exist depending on your setup; use globals().get to avoid NameError
-    research = globals().get("_research_mcp", None)
-    stock    = globals().get("_stock_mcp", None)
-    budget   = globals().get("_budget_mcp", None)
+    await close_all()
 
-    # Reverse of ensure/connect order: research -> stock -> budget
-    await _safe_close(research, "research_mcp")
-    await _safe_close(stock,    "stock_mcp")
-    await _safe_close(budget,   "budget_mcp")
+def close_tools_at_exit():
+    """close_tools for process shutdown (atexit), called from outside the event loop."""
+    close_all_blocking()
 
 def setup_logger():
     logger = logging.getLogger("orchestrator")
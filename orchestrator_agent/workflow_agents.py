@@ -1,10 +1,14 @@
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 import os
+import sys
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+# Model tiers and ticker extraction are shared with the sub-agents
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sub_agents"))
+from model_tiers import DEFAULT_TIER, TIERS, build_model, choose_tier, settings_for
+from market_data import extract_tickers
 
 
 load_dotenv()
@@ -28,30 +32,95 @@ class NLUOutput(BaseModel):
     intent_specific_queries: IntentSpecificQuery
     chat_history: str = Field(description="history of previous messages")
 
-nlu_agent = Agent(
-    name="nlu-agent",
-    model=OpenAIChat(id="gpt-5-nano"),
-    description="Extract intent, entities, and user profile from natural language input",
-    output_schema=NLUOutput,
-    add_history_to_context=True,
-    num_history_runs=3,
-    instructions="""
-                    Analyze the input to determine user intent (stock, budget or research), 
-                    parse the specific questions related to the three possible intents and infer user profile characteristics.
-                """
-)
-
-writer = Agent(
-    model=OpenAIChat(),
-    instructions=(
-        "You are a financial writing agent. Take provided responses (budget/stock/research) "
-        "and write clearly and concisely. Include tables for any budget section. "
-        "Only include sections that have content."
-    ),
-    add_history_to_context=True,
-    num_history_runs=3,
-    markdown=True,
-)
+class IntentRequest(BaseModel):
+    """Compact per-intent payload sent to one sub-agent MCP tool."""
+    model_config = ConfigDict(frozen=True)
+
+    processed_input: str = Field(description="Intent specific part of the user's query")
+    location: Optional[str] = Field(default=None, description="User's location, if the tool uses it")
+    income: Optional[str] = Field(default=None, description="User's monthly income, if the tool uses it")
+    user_id: Optional[str] = Field(default=None, description="Session id for tools that keep per-user memory")
+    client_ip: Optional[str] = Field(default=None, description="Client address, used to locate the user when nothing else does")
+    tier: Optional[str] = Field(default=None, description="Model tier for the sub-agent run: light, standard or deep")
+
+# Profile fields each sub-agent tool actually reads
+INTENT_PROFILE_FIELDS = {
+    "budget": ("location", "income"),
+    "stock": (),
+    "research": (),
+}
+# Tools that keep per-user memory and need the session id
+USER_SCOPED_INTENTS = ("budget",)
+
+def build_intent_requests(nlu: NLUOutput, user_id: Optional[str] = None,
+                          client_ip: Optional[str] = None) -> dict[str, IntentRequest]:
+    """
+    Build one immutable request per detected intent from the NLU output.
+    Only the intent specific query and the profile fields that tool needs are kept;
+    chat_history and the rest of the NLU output never go over the wire.
+    Each request carries the model tier for its query (see model_tiers.choose_tier).
+    """
+    queries = nlu.intent_specific_queries
+    requests = {}
+    for intent in ("budget", "stock", "research"):
+        if intent not in nlu.intent:
+            continue
+        profile = {
+            field: value for field in INTENT_PROFILE_FIELDS[intent]
+            if (value := getattr(nlu.user_profile, field, None))
+        }
+        if intent in USER_SCOPED_INTENTS:
+            if user_id:
+                profile["user_id"] = user_id
+            if client_ip and not profile.get("location"):
+                profile["client_ip"] = client_ip
+        query = getattr(queries, f"{intent}_query", None) or nlu.processed_input
+        tickers = len(extract_tickers(query)) if intent == "stock" else 0
+        tier = choose_tier(query, nlu.confidence, intents=len(nlu.intent), tickers=tickers)
+        requests[intent] = IntentRequest(processed_input=query, tier=tier, **profile)
+    return requests
+
+def nlu_agent_for(tier: str) -> Agent:
+    return Agent(
+        name="nlu-agent",
+        model=build_model(settings_for("nlu", tier)),
+        description="Extract intent, entities, and user profile from natural language input",
+        output_schema=NLUOutput,
+        # No agent history: it would be shared by every session and sit in front of the
+        # new message. The orchestrator sends this session's past conversation instead.
+        instructions="""
+                        Analyze the input to determine user intent (stock, budget or research), 
+                        parse the specific questions related to the three possible intents and infer user profile characteristics.
+                        The message gives the past conversation first and the new user message last;
+                        classify the new message and use the past conversation only to resolve references.
+                    """
+    )
+
+def writer_for(tier: str) -> Agent:
+    return Agent(
+        # Explicit per tier (model_tiers.DEFAULT_POLICY["writer"]) instead of OpenAIChat()'s default
+        model=build_model(settings_for("writer", tier)),
+        # Everything static lives here so it is a cacheable prefix; the prompt itself
+        # is only the sections, then the past conversation
+        instructions=(
+            "You are a financial writing agent. Take provided responses (budget/stock/research) "
+            "and write clearly and concisely. Include tables for any budget section. "
+            "Only include sections that have content.\n"
+            "Each message has one '=== <name>_response ===' block per section, then the past "
+            "conversation for context (only the last few turns). Summarize the available sections; "
+            "if a section says its service was unavailable, mention that this part could not be answered.\n"
+            "Sections are compacted: a 'TABLE' line starts a table given as one pipe-separated row per "
+            "line, header first; render it as a markdown table. [n] markers cite the numbered links in "
+            "the '=== sources ===' block; keep the markers and list the cited sources as links at the end."
+        ),
+        markdown=True,
+    )
+
+# One NLU agent and one writer per model tier
+nlu_agents = {tier: nlu_agent_for(tier) for tier in TIERS}
+writers = {tier: writer_for(tier) for tier in TIERS}
+nlu_agent = nlu_agents[DEFAULT_TIER]
+writer = writers[DEFAULT_TIER]
 
 if __name__ == '__main__':
     response = nlu_agent.run("I make $7000 net and I live in NYC help me budget for the city with a specific focus on high-yield invests and lots of entertainment funds")
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Optional
+
+from model_tiers import DEFAULT_TIER, TIERS, normalize_tier
+
+if TYPE_CHECKING:
+    from agno.agent import Agent
+
+
+class PoolSaturated(RuntimeError):
+    """Raised instead of queueing when max_waiting callers are already waiting."""
+
+
+class AgentPool:
+    """
+    A fixed set of prebuilt agents, handed out one run at a time.
+
+    Building an Agent (model client, toolkits, instructions) happens once in warm(),
+    not on the request path. An agent is only ever used by one run at a time, so
+    runs never share state; callers wait when every agent is busy.
+
+    warm() may run on a warm-up thread: the build count is taken under a lock, and
+    agents reach the event loop's queue through call_soon_threadsafe (or are staged
+    until the first acquire() when the loop isn't running yet).
+
+    With max_waiting set the wait queue is bounded: once that many callers are
+    waiting, acquire() raises PoolSaturated right away so the client can back off
+    instead of piling up behind a deadline it will miss anyway.
+    """
+
+    def __init__(self, factory: Callable[[], "Agent"], size: int = 4, max_waiting: Optional[int] = None):
+        self.factory = factory
+        self.size = size
+        self.max_waiting = max_waiting
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._built = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._staged = []
+        self.waiting = 0
+        self.busy = 0
+        self.rejected = 0
+        self.served = 0
+        self.wait_times = deque(maxlen=1000)
+
+    def warm(self):
+        """Build any agents not built yet. Safe to call more than once, from any thread."""
+        while True:
+            with self._lock:
+                if self._built >= self.size:
+                    return
+                self._built += 1
+            try:
+                agent = self.factory()
+            except Exception:
+                with self._lock:
+                    self._built -= 1
+                raise
+            self._hand_over(agent)
+
+    def _hand_over(self, agent: "Agent"):
+        with self._lock:
+            if self._loop is None:
+                self._staged.append(agent)
+                return
+            loop = self._loop
+        loop.call_soon_threadsafe(self._idle.put_nowait, agent)
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize() + len(self._staged)
+
+    @asynccontextmanager
+    async def acquire(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+                for agent in self._staged:
+                    self._idle.put_nowait(agent)
+                self._staged.clear()
+        if self._built < self.size:
+            # Normally done by warm-up already; never build agents on the event loop
+            await asyncio.to_thread(self.warm)
+        if self.max_waiting is not None and self._idle.empty() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.waiting} requests already queued for {self.size} agents")
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            agent = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        self.wait_times.append(time.perf_counter() - queued)
+        self.busy += 1
+        try:
+            yield agent
+        finally:
+            self.busy -= 1
+            self.served += 1
+            self._idle.put_nowait(agent)
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        p = lambda q: waits[min(int(q * len(waits)), len(waits) - 1)] if waits else 0.0
+        return {
+            "size": self.size,
+            "busy": self.busy,
+            "queue_depth": self.waiting,
+            "max_waiting": self.max_waiting,
+            "served": self.served,
+            "rejected": self.rejected,
+            "queue_wait_p50": p(0.50),
+            "queue_wait_p95": p(0.95),
+        }
+
+    def prometheus(self, name: str) -> str:
+        """Pool gauges and counters in Prometheus text format, labelled with the pool name."""
+        stats = self.stats()
+        lines = []
+        for key, kind in (("size", "gauge"), ("busy", "gauge"), ("queue_depth", "gauge"),
+                          ("served", "counter"), ("rejected", "counter")):
+            lines += [f"# TYPE agent_pool_{key} {kind}", f'agent_pool_{key}{{pool="{name}"}} {stats[key]}']
+        lines.append("# TYPE agent_pool_queue_wait_seconds gauge")
+        for q in ("p50", "p95"):
+            lines.append(f'agent_pool_queue_wait_seconds{{pool="{name}",quantile="0.{q[1:]}"}} {stats[f"queue_wait_{q}"]}')
+        return "\n".join(lines) + "\n"
+
+
+class TieredAgentPool:
+    """
+    One AgentPool per model tier: the same agent built with a cheaper or a
+    stronger model (see model_tiers). factory(tier) builds one agent; each
+    tier gets its own `size` agents. max_waiting bounds the callers waiting
+    across all tiers together.
+    """
+
+    def __init__(self, factory: Callable[[str], "Agent"], size: int = 4, max_waiting: Optional[int] = None):
+        self.max_waiting = max_waiting
+        self.pools = {tier: AgentPool(partial(factory, tier), size) for tier in TIERS}
+
+    def warm(self):
+        # The default tier first: it serves requests from older clients that send no tier
+        for tier in sorted(self.pools, key=lambda t: t != DEFAULT_TIER):
+            self.pools[tier].warm()
+
+    def acquire(self, tier: Optional[str] = None):
+        pool = self.pools[normalize_tier(tier)]
+        if self.max_waiting is not None and not pool.idle and self.waiting >= self.max_waiting:
+            pool.rejected += 1
+            raise PoolSaturated(f"{self.waiting} requests already queued for {len(self.pools)} x {pool.size} agents")
+        return pool.acquire()
+
+    @property
+    def waiting(self) -> int:
+        return sum(pool.waiting for pool in self.pools.values())
+
+    def stats(self) -> dict:
+        return {tier: pool.stats() for tier, pool in self.pools.items()}
+
+    def prometheus(self, name: str) -> str:
+        # Each metric family once, with every tier's samples under it
+        families = {}
+        for tier, pool in self.pools.items():
+            family = None
+            for line in pool.prometheus(f"{name}_{tier}").splitlines():
+                if line.startswith("# TYPE"):
+                    family = families.setdefault(line, [])
+                else:
+                    family.append(line)
+        return "".join(f"{header}\n" + "".join(f"{line}\n" for line in samples) for header, samples in families.items())
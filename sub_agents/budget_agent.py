@@ -3,17 +3,18 @@ import json
 import re
 from dotenv import load_dotenv
 from fastmcp import FastMCP
-import requests
-from fastapi import FastAPI
 from textwrap import dedent
-from typing import Dict, List, Optional, Any
-from requests.exceptions import JSONDecodeError
-from agno.os import AgentOS
-from agno.agent import Agent, RunOutput
-from agno.exceptions import RetryAgentRun
-from agno.models.openai import OpenAIChat
-from agno.tools.reasoning import ReasoningTools
-from agno.tools.tavily import TavilyTools
+from typing import TYPE_CHECKING, Optional
+from agent_pool import TieredAgentPool
+from model_tiers import DEFAULT_TIER, build_model, choose_tier, reasoning_tools, settings_for, tier_metrics
+from memory_store import create_store
+from budget_engine import build_budget_facts
+from geolocation import resolve_locale
+from prompt_layout import compose_message, with_cache_metrics
+from warmup import Warmup
+
+if TYPE_CHECKING:
+  from agno.agent import Agent, RunOutput
 
 
 
@@ -22,24 +23,13 @@ MAX_TURNS = 8
 load_dotenv()
 
 # ====== BASIC MEMORY ======
-MEMORY_FILE = "budget_memory.json"
-
-def _mem_load():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r") as f:
-            return json.load(f)
-    return {}  # no memory yet
-
-def _mem_save(mem: dict):
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(mem, f, indent=2)
-
-def get_memory() -> dict:
-    # Single-user, minimal defaults
-    mem = _mem_load()
-    return mem or {
+MEMORY_FILE = "budget_memory.json"  # legacy single-user file, imported once as "default"
+MEMORY_DB = os.getenv("BUDGET_MEMORY_DB", "budget_memory.sqlite")
+
+def default_memory() -> dict:
+    return {
         "currency": "USD",
-        "locale": "US-NY",
+        "locale": None,     # filled from the user's location or an IP lookup
         "profile": {        # anything stable about finances
             "income_net": None,
             "fixed_expenses": {},
@@ -49,75 +39,65 @@ def get_memory() -> dict:
         "last_plan": None
     }
 
-def update_memory(updates: dict):
-    # Shallow merge only
-    cur = get_memory()
-    for k, v in updates.items():
-        if isinstance(v, dict) and isinstance(cur.get(k), dict):
-            cur[k].update(v)
-        else:
-            cur[k] = v
-    _mem_save(cur)
-
-# Creating tool
-def get_local_data() -> Optional[Dict[str, Any]]:
-  """
-  Use this function to get the users location from their IP Address.
-
-  Args:
-      None
-  Returns:
-      str: JSON string of the user's location.
-  """
-  try:
-    response = requests.get("http://ip-api.com/json/")
-    response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-    return response.json()
-  except JSONDecodeError as e:
-    print(f"JSONDecodeError: {e}")
-    print(f"Raw response text: {response.text}")
-    return None
-  except requests.exceptions.RequestException as e:
-    print(f"RequestException: {e}")
-    return None
-
+memory_store = create_store(MEMORY_DB, default_memory)
+memory_store.seed_from_json(MEMORY_FILE)
 
-#Budget-Agent
+def get_memory(user_id: str = "default") -> dict:
+    return memory_store.get(user_id)
 
-# Initialize MCP and AgentOS instances
+def update_memory(updates: dict, user_id: str = "default"):
+    # Shallow merge only, applied atomically by the store
+    memory_store.update(user_id, updates)
 
-def budget_agent() -> Agent:
-  tools = [ReasoningTools(), get_local_data]
-  user_ctx = get_memory()
+#Budget-Agent
 
-  return Agent(
-    name="budget-agent",
-    model=OpenAIChat(id="gpt-5-nano"),
-    instructions=dedent(f"""
+BUDGET_INSTRUCTIONS = dedent("""
             Concise budgeting assistant. Output under ~500 words.
             1) Snapshot (income, expenses, debts, savings)
             2) Budget by category (% vs common benchmarks)
             3) Risks + 3 quick wins
             4) 4-week action plan
-            Only call tools if strictly needed.
-                        
-            don't use chat_history unless explicitly referenced
+
+            Each message gives the user's stored profile as USER_CONTEXT, then BUDGET_FACTS
+            when available, then the user's QUESTION and today's date.
+            When BUDGET_FACTS is given, every number in it (allocation table, weekly allowances,
+            debt payoff schedules, savings timeline) is already computed: use those numbers
+            exactly as given and do not recalculate them. Your job is the explanation and plan.
 
             If you learn stable facts (income, fixed bills, debts/APRs, savings goal, locale),
             append a single MEMORY_JSON line at the very end with a small JSON object
-            containing ONLY changed fields. Example:
-            MEMORY_JSON {{"profile": {{"income_net": 5200}}}}
+            containing ONLY changed fields. Income is monthly net; APRs are percents. Example:
+            MEMORY_JSON {"profile": {"income_net": 5200, "debts": [{"name": "visa", "balance": 3000, "apr": 24.9}]}}
+      """)
+
+def budget_agent(tier: str = DEFAULT_TIER) -> "Agent":
+  # Static agent: the system prompt is identical for every run, so it stays a
+  # cacheable prefix. Per-user context, history and the date go in the message.
+  # agno and the OpenAI SDK are imported here, on the warm-up thread, not at module load
+  from agno.agent import Agent
+  settings = settings_for("budget", tier)
+  tools = reasoning_tools(settings)
 
-            USER_CONTEXT:
-            {json.dumps(user_ctx, ensure_ascii=False)}
-      """),
+  return Agent(
+    name="budget-agent",
+    model=build_model(settings),
+    instructions=BUDGET_INSTRUCTIONS,
       tools=tools,
-      add_history_to_context=True,
-      num_history_runs=3,
-      add_datetime_to_context = True,
       markdown=True,
   )
 
+# Agents are built once during warm-up, not per tool call; one set per model tier
+budget_pool = TieredAgentPool(budget_agent, size=int(os.getenv("BUDGET_AGENT_POOL_SIZE", 4)))
+BUDGET_MAX_ATTEMPTS = int(os.getenv("BUDGET_MAX_ATTEMPTS", 3))
+
+warmup = Warmup("budget")
+warmup.step(budget_pool.warm)
+warmup.install(mcp)
+warmup.start()
+
+def with_user_context(query: str, user_ctx: dict, facts: Optional[dict] = None) -> str:
+  return compose_message(query, {"USER_CONTEXT": user_ctx, "BUDGET_FACTS": facts})
+
 def extract_memory_json(text: str) -> dict:
     # Look for a line starting with 'MEMORY_JSON ' followed by {...}
     m = re.search(r'^MEMORY_JSON\s+(\{.*\})\s*$', text, flags=re.MULTILINE|re.DOTALL)
@@ -128,27 +108,41 @@ def extract_memory_json(text: str) -> dict:
     except Exception:
         return {}
 
-  
-retry_count = 0
 @mcp.tool()
 async def create_budget(message: dict) -> dict:
   input = message['processed_input']
-  agent = budget_agent()
+  user_id = message.get("user_id") or "default"
+  # Profile hints the orchestrator forwards alongside the query (optional)
+  profile = {k: message[k] for k in ("location", "income") if message.get(k)}
+  if profile:
+    input = f"{input}\n\nReported profile: {json.dumps(profile, ensure_ascii=False)}"
   try:
-    response: RunOutput = await agent.arun(input)
-    text = response.content if hasattr(response, "content") else str(response)
+    await warmup.wait()
+    # Skips the IP lookup whenever the location is already known
+    await resolve_locale(memory_store, user_id, message.get("location"), message.get("client_ip"))
+    user_ctx = get_memory(user_id)
+    # Numbers come from the local engine; the model only writes the narrative
+    facts = build_budget_facts(user_ctx, income_hint=message.get("income"), request=message['processed_input'])
+    prompt = with_user_context(input, user_ctx, facts)
+    # The orchestrator sends the tier; older clients get one picked from the query here
+    settings = settings_for("budget", message.get("tier") or choose_tier(message['processed_input']))
+    async with budget_pool.acquire(settings["tier"]) as agent:
+      for attempt in range(1, BUDGET_MAX_ATTEMPTS + 1):
+        response: "RunOutput" = await agent.arun(prompt)
+        if response.content:
+          break
+        prompt = with_user_context(
+          f"Create or provide information about budget based on the users response. users:{input}", user_ctx, facts)
+    text = response.content or ""
     mem_updates = extract_memory_json(text)
     if mem_updates:
-        update_memory(mem_updates)
+        update_memory(mem_updates, user_id)
         # Optionally remove the MEMORY_JSON line from the final reply:
         text = re.sub(r'^MEMORY_JSON\s+(\{.*\})\s*$', '', text, flags=re.MULTILINE)
-    
-    if text == None and retry_count<2:
-      retry_count+=1
-      raise RetryAgentRun(
-         f"Create or provide information about budget based on the users response. users:{input}"
-      )
-    return {"metrics": response.metrics.to_dict(),"content": text}
+    metrics = with_cache_metrics(response.metrics.to_dict())
+    metrics.update(tier_metrics(settings))
+    metrics["attempts"] = attempt
+    return {"metrics": metrics,"content": text}
   except Exception as e:
     return f"Tool error: {type(e).__name__}: {e}"
   
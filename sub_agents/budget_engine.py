@@ -0,0 +1,284 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+WEEKS_PER_MONTH = 52 / 12
+
+# National benchmark shares of net income (sum to 1.0)
+BASE_SHARES = {
+    "housing": 0.28,
+    "transportation": 0.10,
+    "food": 0.12,
+    "utilities": 0.06,
+    "healthcare": 0.06,
+    "entertainment": 0.06,
+    "personal": 0.05,
+    "debt": 0.07,
+    "savings": 0.20,
+}
+# Cost of living relative to the national average, mostly driven by housing
+COST_INDEX = {
+    "US": 1.00, "US-NY": 1.45, "US-CA": 1.35, "US-MA": 1.30, "US-WA": 1.20, "US-DC": 1.35,
+    "US-NJ": 1.20, "US-HI": 1.45, "US-IL": 1.05, "US-CO": 1.10, "US-FL": 1.02, "US-TX": 0.95,
+    "US-GA": 0.93, "US-NC": 0.92, "US-OH": 0.88, "US-MI": 0.88, "US-TN": 0.90, "US-AZ": 0.98,
+}
+# Categories that absorb the extra housing cost in expensive areas, in order
+FLEX_CATEGORIES = ("entertainment", "personal", "transportation", "savings")
+FIXED_EXPENSE_CATEGORIES = {
+    "housing": ("rent", "mortgage", "hoa", "housing", "insurance home", "renters"),
+    "transportation": ("car", "auto", "gas", "transit", "metro", "uber", "parking", "insurance auto"),
+    "utilities": ("electric", "utility", "utilities", "water", "internet", "phone", "wifi", "cell"),
+    "healthcare": ("health", "medical", "dental", "pharmacy", "insurance health"),
+    "food": ("grocer", "food"),
+    "entertainment": ("netflix", "spotify", "subscription", "gym", "streaming"),
+}
+ENTERTAINMENT_PREFERENCE = {"low": 0.6, "normal": 1.0, "high": 1.6}
+
+def _regional_shares(index: float) -> Dict[str, float]:
+    shares = dict(BASE_SHARES)
+    extra = BASE_SHARES["housing"] * (index - 1)
+    shares["housing"] = BASE_SHARES["housing"] + extra
+    if extra <= 0:
+        # Cheaper areas: the housing difference goes to savings
+        shares["savings"] -= extra
+        return shares
+    # Take the difference out of the flexible categories, never below half their base share
+    for category in FLEX_CATEGORIES:
+        take = min(extra, shares[category] - BASE_SHARES[category] / 2)
+        shares[category] -= take
+        extra -= take
+    return shares
+
+# Precomputed once at import: locale -> category shares
+REGIONAL_BENCHMARKS = {locale: _regional_shares(index) for locale, index in COST_INDEX.items()}
+
+def parse_money(value) -> Optional[float]:
+    """'$5,200', '5.2k', 5200 -> 5200.0; None when there is no number."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    # "k" only counts when attached to the number: "5.2k" but not "5000 kr" or "4,500 keeping"
+    m = re.search(r"(\d[\d,]*(?:\.\d+)?)(k\b)?", str(value), re.I)
+    if not m:
+        return None
+    amount = float(m.group(1).replace(",", ""))
+    return amount * 1000 if m.group(2) else amount
+
+_ANNUAL = re.compile(r"\b(a|per|each|every) year\b|/\s*(yr|year)\b|\b(annual(ly)?|yearly|salary|p\.?a\.?)\b", re.I)
+_WEEKLY = re.compile(r"\b(a|per|each|every) week\b|/\s*(wk|week)\b|\bweekly\b", re.I)
+
+def parse_monthly(value) -> Optional[float]:
+    """Like parse_money, as a monthly figure: '$60k a year' -> 5000.0, '$500/week' -> 2166.67."""
+    amount = parse_money(value)
+    if amount is None or isinstance(value, (int, float)):
+        return amount
+    if _ANNUAL.search(str(value)):
+        return amount / 12
+    if _WEEKLY.search(str(value)):
+        return amount * WEEKS_PER_MONTH
+    return amount
+
+def parse_rate(value) -> Optional[float]:
+    """An APR given as a percent, with or without the sign: '24.9%', 24.9, '0.5%' -> 0.249, 0.249, 0.005."""
+    amount = parse_money(value)
+    return None if amount is None else amount / 100
+
+_ENTERTAINMENT_HIGH = re.compile(
+    r"\b(entertainment|fun)[- ]heavy\b|\b(lots|plenty|a lot) of (entertainment|fun)\b|"
+    r"\b(more|extra|bigger|generous) (entertainment|fun)\b|\b(heavy|focus) on (entertainment|fun)\b", re.I)
+_ENTERTAINMENT_LOW = re.compile(
+    r"\b(entertainment|fun)[- ]light\b|\b(less|little|minimal|no|cut|lower|reduced?) (entertainment|fun)\b|"
+    r"\b(frugal|bare[- ]bones|tight budget)\b", re.I)
+
+def entertainment_preference(text: Optional[str]) -> str:
+    """'low', 'normal' or 'high' from how the request talks about entertainment."""
+    text = text or ""
+    if _ENTERTAINMENT_LOW.search(text):
+        return "low"
+    if _ENTERTAINMENT_HIGH.search(text):
+        return "high"
+    return "normal"
+
+def benchmarks_for(locale: Optional[str]) -> Dict[str, float]:
+    locale = (locale or "US").upper()
+    return REGIONAL_BENCHMARKS.get(locale) or REGIONAL_BENCHMARKS.get(locale.split("-")[0], REGIONAL_BENCHMARKS["US"])
+
+def categorize_expense(name: str) -> str:
+    name = name.lower()
+    for category, words in FIXED_EXPENSE_CATEGORIES.items():
+        if any(w in name for w in words):
+            return category
+    return "personal"
+
+def allocation_table(income: float, fixed_expenses: Dict[str, Any], locale: Optional[str],
+                     entertainment: str = "normal", min_debt_payments: float = 0.0) -> List[Dict[str, Any]]:
+    """Recommended monthly amount per category vs the regional benchmark and known fixed bills."""
+    shares = dict(benchmarks_for(locale))
+    factor = ENTERTAINMENT_PREFERENCE.get(str(entertainment).lower(), 1.0)
+    if factor != 1.0:
+        delta = shares["entertainment"] * (factor - 1)
+        shares["entertainment"] += delta
+        shares["personal"] -= delta / 2
+        shares["savings"] -= delta / 2
+
+    fixed = {}
+    for name, amount in (fixed_expenses or {}).items():
+        amount = parse_monthly(amount) or 0.0
+        category = categorize_expense(name)
+        fixed[category] = fixed.get(category, 0.0) + amount
+    if min_debt_payments:
+        fixed["debt"] = fixed.get("debt", 0.0) + min_debt_payments
+
+    # Committed bills are paid in full; when they push a category past its share, the
+    # uncommitted part of every category is scaled down so the total stays within income
+    wanted = {c: max(income * share, fixed.get(c, 0.0)) for c, share in shares.items()}
+    committed_total = sum(fixed.get(c, 0.0) for c in shares)
+    flexible = sum(wanted[c] - fixed.get(c, 0.0) for c in shares)
+    scale = 1.0
+    if sum(wanted.values()) > income and flexible > 0:
+        scale = max(income - committed_total, 0.0) / flexible
+
+    rows = []
+    for category, share in shares.items():
+        committed = fixed.get(category, 0.0)
+        rows.append({
+            "category": category,
+            "benchmark_pct": round(share * 100, 1),
+            "recommended": round(committed + (wanted[category] - committed) * scale, 2),
+            "fixed_committed": round(committed, 2),
+            "over_benchmark_by": round(max(committed - income * share, 0.0), 2),
+        })
+    return rows
+
+def _normalize_debts(debts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+    for i, d in enumerate(debts or []):
+        balance = parse_money(d.get("balance") or d.get("amount"))
+        if not balance:
+            continue
+        apr = parse_rate(d.get("apr") or d.get("rate") or d.get("interest_rate")) or 0.0
+        minimum = parse_monthly(d.get("min_payment") or d.get("minimum") or d.get("minimum_payment"))
+        out.append({
+            "name": d.get("name") or f"debt_{i + 1}",
+            "balance": balance,
+            "apr": apr,
+            "min_payment": minimum if minimum else max(25.0, balance * 0.02),
+        })
+    return out
+
+def payoff_schedule(debts: List[Dict[str, Any]], extra_payment: float, strategy: str = "avalanche",
+                    max_months: int = 600) -> Dict[str, Any]:
+    """
+    Month-by-month payoff simulation. Every debt gets its minimum; the extra payment
+    (plus minimums freed by paid-off debts) goes to the highest APR first (avalanche)
+    or the smallest balance first (snowball). Takes debts as stored in the profile
+    (APRs in percent) and normalizes them here, once.
+    """
+    debts = _normalize_debts(debts)
+    if not debts:
+        return {"strategy": strategy, "months": 0, "total_interest": 0.0, "payoff_order": []}
+    key = (lambda d: -d["apr"]) if strategy == "avalanche" else (lambda d: d["balance"])
+    budget = sum(d["min_payment"] for d in debts) + max(extra_payment, 0.0)
+    total_interest, month, order = 0.0, 0, []
+    while any(d["balance"] > 0.005 for d in debts) and month < max_months:
+        month += 1
+        for d in debts:
+            if d["balance"] > 0:
+                interest = d["balance"] * d["apr"] / 12
+                d["balance"] += interest
+                total_interest += interest
+        remaining = budget
+        for d in debts:
+            pay = min(d["min_payment"], d["balance"], remaining)
+            d["balance"] -= pay
+            remaining -= pay
+        for d in sorted((d for d in debts if d["balance"] > 0), key=key):
+            pay = min(d["balance"], remaining)
+            d["balance"] -= pay
+            remaining -= pay
+        for d in debts:
+            if d["balance"] <= 0.005 and d["name"] not in (o["name"] for o in order):
+                order.append({"name": d["name"], "paid_off_month": month})
+    return {
+        "strategy": strategy,
+        "months": month if month < max_months else None,
+        "total_interest": round(total_interest, 2),
+        "monthly_payment": round(budget, 2),
+        "payoff_order": order,
+    }
+
+def savings_timeline(goal: Any, monthly_saving: float, current: float = 0.0, apy: float = 0.04,
+                     max_months: int = 600) -> Optional[Dict[str, Any]]:
+    """Months to reach a savings goal with monthly contributions earning apy."""
+    target = parse_money(goal.get("amount") if isinstance(goal, dict) else goal)
+    if not target or monthly_saving <= 0:
+        return None
+    balance, month = current, 0
+    while balance < target and month < max_months:
+        balance = balance * (1 + apy / 12) + monthly_saving
+        month += 1
+    return {
+        "goal": round(target, 2),
+        "monthly_saving": round(monthly_saving, 2),
+        "months": month if balance >= target else None,
+        "assumed_apy_pct": round(apy * 100, 2),
+    }
+
+def build_budget_facts(memory: Dict[str, Any], income_hint: Any = None, request: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Every number the budget answer needs, computed deterministically from the
+    user's stored profile and the current request. Income from the request wins
+    over the stored one. Returns {} when there is no income to work from.
+    """
+    profile = memory.get("profile") or {}
+    income = parse_monthly(income_hint) or parse_monthly(profile.get("income_net"))
+    if not income:
+        return {}
+    locale = memory.get("locale")
+    debts = _normalize_debts(profile.get("debts"))
+    min_payments = sum(d["min_payment"] for d in debts)
+    entertainment = entertainment_preference(request)
+    table = allocation_table(income, profile.get("fixed_expenses"), locale, entertainment, min_payments)
+    by_category = {row["category"]: row["recommended"] for row in table}
+
+    extra_for_debt = max(by_category["debt"] - min_payments, 0.0)
+    facts = {
+        "currency": memory.get("currency", "USD"),
+        "locale": locale,
+        "income_net_monthly": round(income, 2),
+        "allocation": table,
+        "allocated_total": round(sum(by_category.values()), 2),
+        "entertainment_preference": entertainment,
+        "weekly_allowances": {
+            c: round(by_category[c] / WEEKS_PER_MONTH, 2) for c in ("food", "entertainment", "personal", "transportation")
+        },
+    }
+    committed = sum(row["fixed_committed"] for row in table)
+    if committed > income:
+        # Fixed bills alone exceed income: say so instead of a plan that cannot add up
+        facts["shortfall"] = round(committed - income, 2)
+    if debts:
+        # The raw profile debts: payoff_schedule normalizes them itself
+        avalanche = payoff_schedule(profile.get("debts"), extra_for_debt, "avalanche")
+        snowball = payoff_schedule(profile.get("debts"), extra_for_debt, "snowball")
+        facts["debt_payoff"] = {
+            "avalanche": avalanche,
+            "snowball": snowball,
+            "interest_saved_with_avalanche": round(snowball["total_interest"] - avalanche["total_interest"], 2),
+        }
+    timeline = savings_timeline(profile.get("savings_goal"), by_category["savings"])
+    if timeline:
+        facts["savings_timeline"] = timeline
+    return facts
+
+if __name__ == "__main__":
+    # Sanity check: the smaller debt has the lower APR and there is money beyond the minimums,
+    # so avalanche must cost less interest than snowball
+    debts = [{"name": "card", "balance": 9000, "apr": "24.9%", "min_payment": 200},
+             {"name": "car", "balance": 4000, "apr": 6.5, "min_payment": 150}]
+    facts = build_budget_facts({"profile": {"income_net": 8000, "debts": debts}})
+    payoff = facts["debt_payoff"]
+    print(json.dumps(payoff, indent=2))
+    assert payoff["avalanche"]["total_interest"] < payoff["snowball"]["total_interest"], "avalanche should cost less than snowball"
+    assert parse_money("5000 kr") == 5000 and parse_money("$4,500 keeping") == 4500 and parse_money("5.2k") == 5200
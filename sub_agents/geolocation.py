@@ -0,0 +1,144 @@
+import asyncio
+import ipaddress
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+GEO_TIMEOUT = float(os.getenv("GEO_TIMEOUT", 2.0))
+# How long a cached lookup for a client IP stays valid
+GEO_CACHE_TTL = int(os.getenv("GEO_CACHE_TTL", 7 * 24 * 3600))
+# A failed lookup is only remembered briefly, so a provider outage doesn't stick for a week
+GEO_FAILURE_TTL = int(os.getenv("GEO_FAILURE_TTL", 300))
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD", "massachusetts": "MA",
+    "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO", "montana": "MT",
+    "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "district of columbia": "DC",
+}
+CITY_STATES = {
+    "nyc": "NY", "new york city": "NY", "brooklyn": "NY", "manhattan": "NY", "los angeles": "CA",
+    "san francisco": "CA", "san diego": "CA", "seattle": "WA",
+    "chicago": "IL", "boston": "MA", "austin": "TX", "houston": "TX", "dallas": "TX",
+    "miami": "FL", "atlanta": "GA", "denver": "CO", "phoenix": "AZ", "philadelphia": "PA",
+    "washington dc": "DC", "dc": "DC", "detroit": "MI", "nashville": "TN", "columbus": "OH",
+}
+# Longest names first, so "west virginia" wins over "virginia" and "new york city" over "new york"
+_PLACE_NAMES = sorted(list(CITY_STATES.items()) + list(US_STATES.items()), key=lambda item: -len(item[0]))
+
+def _public_ip(ip: Optional[str]) -> Optional[str]:
+    # Private/loopback addresses (local runs, docker bridge) can't be located;
+    # an empty lookup locates the server's own public IP instead
+    try:
+        return ip if ip and ipaddress.ip_address(ip).is_global else None
+    except ValueError:
+        return None
+
+def locale_from_location(location: Optional[str]) -> Optional[str]:
+    """'Brooklyn, NY' / 'NYC' / 'Texas' -> 'US-NY' / 'US-NY' / 'US-TX'; None if unknown."""
+    if not location:
+        return None
+    text = location.strip().lower()
+    for name, code in _PLACE_NAMES:
+        if re.search(rf"\b{re.escape(name)}\b", text):
+            return f"US-{code}"
+    m = re.search(r"\b([A-Z]{2})\b", location)
+    if m and m.group(1) in US_STATES.values():
+        return f"US-{m.group(1)}"
+    return None
+
+class IpApiProvider:
+    """ip-api.com lookups over one pooled async client with a hard timeout."""
+
+    def __init__(self, base_url: str = "http://ip-api.com/json/", timeout: float = GEO_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def lookup(self, ip: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._client.get(self.base_url + (ip or ""))
+            response.raise_for_status()
+            data = response.json()
+            return data if data.get("status") == "success" else None
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[geolocation] lookup failed: {type(e).__name__}: {e}")
+            return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class StaticGeoProvider:
+    """Returns a fixed result without any network access; for tests and offline runs."""
+
+    def __init__(self, result: Optional[Dict[str, Any]] = None):
+        self.result = result
+        self.calls = 0
+
+    async def lookup(self, ip: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        return self.result
+
+_provider = IpApiProvider()
+# Lookups in flight per client IP, so concurrent requests share one call
+_inflight: Dict[Optional[str], asyncio.Task] = {}
+
+def set_geo_provider(provider):
+    """Swap the lookup backend, e.g. set_geo_provider(StaticGeoProvider({...}))."""
+    global _provider
+    _provider = provider
+
+def get_geo_provider():
+    return _provider
+
+async def resolve_locale(memory_store, user_id: str, location: Optional[str] = None,
+                         client_ip: Optional[str] = None) -> Optional[str]:
+    """
+    The user's locale, looking it up by IP only as a last resort:
+    1. the location the user told us (NLU user_profile.location)
+    2. the locale already stored in their memory
+    3. a cached lookup for this client IP (a failed one only for GEO_FAILURE_TTL)
+    4. a fresh lookup, cached in the memory store
+    """
+    memory = memory_store.get(user_id)
+    locale = locale_from_location(location)
+    if locale:
+        if locale != memory.get("locale"):
+            memory_store.update(user_id, {"locale": locale})
+        return locale
+    if memory.get("locale"):
+        return memory["locale"]
+
+    cached = memory.get("geo") or {}
+    ttl = GEO_CACHE_TTL if cached.get("locale") else GEO_FAILURE_TTL
+    if cached.get("ip") == client_ip and time.time() - cached.get("fetched_at", 0) < ttl:
+        return cached.get("locale")
+
+    task = _inflight.get(client_ip)
+    if task is None:
+        task = _inflight[client_ip] = asyncio.ensure_future(_provider.lookup(_public_ip(client_ip)))
+        task.add_done_callback(lambda _: _inflight.pop(client_ip, None))
+    data = await asyncio.shield(task)
+    locale = None
+    if data and data.get("countryCode"):
+        region = data.get("region")
+        locale = f"{data['countryCode']}-{region}" if region else data["countryCode"]
+    memory_store.update(user_id, {
+        "locale": locale,
+        "geo": {"ip": client_ip, "locale": locale, "city": (data or {}).get("city"), "fetched_at": time.time()},
+    })
+    return locale
@@ -0,0 +1,299 @@
+"""
+Offline BM25 index over local financial-literacy docs for the research server.
+
+    python local_index.py build research_docs     # (re)build, re-reading only changed files
+    python local_index.py query "roth vs traditional ira"
+
+Chunks, postings and chunk text live in numpy/binary files under INDEX_DIR and
+are memory-mapped, so every research process shares the pages instead of
+holding its own copy.
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+# numpy is imported inside the functions that use it, so importing this module
+# (and the research server) stays cheap
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DOCS_DIR = os.getenv("RESEARCH_DOCS_DIR", os.path.join(HERE, "research_docs"))
+INDEX_DIR = os.getenv("RESEARCH_INDEX_DIR", os.path.join(HERE, "research_index"))
+# Words per chunk and words shared with the previous chunk
+CHUNK_WORDS = int(os.getenv("INDEX_CHUNK_WORDS", 220))
+CHUNK_OVERLAP = int(os.getenv("INDEX_CHUNK_OVERLAP", 40))
+# Below this the research agent goes to web search instead
+MIN_CONFIDENCE = float(os.getenv("LOCAL_INDEX_MIN_CONFIDENCE", 0.6))
+DOC_EXTENSIONS = (".md", ".txt")
+K1, B = 1.5, 0.75
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "is", "are", "be", "what", "whats", "how",
+    "does", "do", "me", "my", "i", "please", "can", "you", "tell", "about", "with", "its", "it", "or",
+    "that", "this", "as", "at", "by", "from", "if", "your", "should", "vs", "versus", "explain", "explained",
+}
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        # Light plural folding: "accounts" -> "account", "policies" -> "policy"
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+def chunk_document(text: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Dict[str, str]]:
+    """Split on markdown headings, then into overlapping windows of about `words` words."""
+    chunks = []
+    for section in re.split(r"\n(?=#{1,3} )", text):
+        title = section.strip().splitlines()[0].lstrip("# ").strip() if section.strip() else ""
+        tokens = section.split()
+        step = max(words - overlap, 1)
+        for start in range(0, max(len(tokens), 1), step):
+            body = " ".join(tokens[start:start + words])
+            if body:
+                chunks.append({"title": title, "text": body})
+            if start + words >= len(tokens):
+                break
+    return chunks
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def build_index(docs_dir: str = DOCS_DIR, index_dir: str = INDEX_DIR) -> Dict[str, int]:
+    """
+    Build or refresh the index. Files whose content hash is unchanged keep their
+    existing chunks; only new or edited files are read and chunked again. The new
+    generation is written beside the old one and switched in atomically.
+    """
+    import numpy as np
+    old = _load_chunks(index_dir)
+    old_by_source = defaultdict(list)
+    for chunk in old["chunks"]:
+        old_by_source[chunk["source"]].append(chunk)
+
+    chunks, manifest, reused, rechunked = [], {}, 0, 0
+    for root, _, files in os.walk(docs_dir):
+        for name in sorted(files):
+            if not name.endswith(DOC_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, docs_dir)
+            digest = _file_hash(path)
+            manifest[source] = digest
+            if old["manifest"].get(source) == digest:
+                chunks += old_by_source[source]
+                reused += 1
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for chunk in chunk_document(f.read()):
+                    chunks.append({"source": source, **chunk})
+            rechunked += 1
+
+    if manifest == old["manifest"]:
+        return {"files": len(manifest), "reused": reused, "rechunked": 0, "chunks": len(chunks), "changed": 0}
+
+    # Inverted index: per term, the chunk ids and term frequencies (CSR layout)
+    vocab: Dict[str, int] = {}
+    postings = defaultdict(list)
+    doc_len = np.zeros(len(chunks), dtype=np.float32)
+    for doc_id, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk["title"] + " " + chunk["text"]))
+        doc_len[doc_id] = sum(counts.values())
+        for term, tf in counts.items():
+            postings[vocab.setdefault(term, len(vocab))].append((doc_id, tf))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for term_id in range(len(vocab)):
+        indptr[term_id + 1] = indptr[term_id] + len(postings[term_id])
+    doc_ids = np.fromiter((d for t in range(len(vocab)) for d, _ in postings[t]), dtype=np.int32, count=int(indptr[-1]))
+    tfs = np.fromiter((tf for t in range(len(vocab)) for _, tf in postings[t]), dtype=np.float32, count=int(indptr[-1]))
+
+    generation = f"gen-{time.time_ns()}"
+    target = os.path.join(index_dir, generation)
+    os.makedirs(target)
+    np.save(os.path.join(target, "indptr.npy"), indptr)
+    np.save(os.path.join(target, "doc_ids.npy"), doc_ids)
+    np.save(os.path.join(target, "tfs.npy"), tfs)
+    np.save(os.path.join(target, "doc_len.npy"), doc_len)
+    # Chunk text as one blob with offsets, so it can be memory-mapped too
+    blob = bytearray()
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    for i, chunk in enumerate(chunks):
+        blob += chunk["text"].encode("utf-8")
+        offsets[i + 1] = len(blob)
+    with open(os.path.join(target, "texts.bin"), "wb") as f:
+        f.write(blob or b" ")
+    np.save(os.path.join(target, "offsets.npy"), offsets)
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump({
+            "vocab": vocab,
+            "chunks": [{"source": c["source"], "title": c["title"]} for c in chunks],
+            "manifest": manifest,
+        }, f)
+    pointer = os.path.join(index_dir, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(generation)
+    os.replace(pointer + ".tmp", pointer)
+    for name in os.listdir(index_dir):
+        if name.startswith("gen-") and name != generation:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    return {"files": len(manifest), "reused": reused, "rechunked": rechunked, "chunks": len(chunks),
+            "changed": rechunked + len(set(old["manifest"]) - set(manifest))}
+
+def _current_generation(index_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(index_dir, "CURRENT")) as f:
+            path = os.path.join(index_dir, f.read().strip())
+        return path if os.path.isdir(path) else None
+    except FileNotFoundError:
+        return None
+
+def _load_chunks(index_dir: str) -> Dict[str, Any]:
+    """Chunks (with text) and manifest of the current generation, for incremental rebuilds."""
+    import numpy as np
+    path = _current_generation(index_dir)
+    if path is None:
+        return {"chunks": [], "manifest": {}}
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    offsets = np.load(os.path.join(path, "offsets.npy"))
+    with open(os.path.join(path, "texts.bin"), "rb") as f:
+        blob = f.read()
+    chunks = [
+        {**c, "text": blob[offsets[i]:offsets[i + 1]].decode("utf-8")}
+        for i, c in enumerate(meta["chunks"])
+    ]
+    return {"chunks": chunks, "manifest": meta["manifest"]}
+
+class LocalIndex:
+    """
+    Read side of the index. Arrays are opened with mmap_mode="r" and reopened
+    when a rebuild switches CURRENT to a new generation.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> bool:
+        path = _current_generation(self.index_dir)
+        if path is None:
+            return False
+        if path == self._generation:
+            return True
+        with self._lock:
+            if path != self._generation:
+                import numpy as np
+                load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+                with open(os.path.join(path, "meta.json")) as f:
+                    meta = json.load(f)
+                self.vocab = meta["vocab"]
+                self.chunks = meta["chunks"]
+                self.indptr, self.doc_ids, self.tfs = load("indptr.npy"), load("doc_ids.npy"), load("tfs.npy")
+                self.doc_len, self.offsets = load("doc_len.npy"), load("offsets.npy")
+                with open(os.path.join(path, "texts.bin"), "rb") as f:
+                    self.texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 1.0
+                self._generation = path
+        return True
+
+    def _text(self, doc_id: int) -> str:
+        return self.texts[int(self.offsets[doc_id]):int(self.offsets[doc_id + 1])].decode("utf-8")
+
+    def search(self, query: str, k: int = 4) -> Dict[str, Any]:
+        """
+        Top-k chunks by BM25. confidence is the idf-weighted share of the query's
+        terms that the best chunk contains, so 1.0 means every term was found.
+        """
+        import numpy as np
+        if not self._open() or not self.chunks:
+            return {"confidence": 0.0, "results": []}
+        terms = list(dict.fromkeys(tokenize(query)))
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float32)
+        weights, matched = {}, defaultdict(set)
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                # Unknown terms still count against confidence
+                weights[term] = math.log(1 + n)
+                continue
+            start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights[term] = idf
+            norm = tf + K1 * (1 - B + B * self.doc_len[docs] / self.avg_len)
+            scores[docs] += idf * tf * (K1 + 1) / norm
+            for d in docs.tolist():
+                matched[d].add(term)
+        if not weights or not scores.any():
+            return {"confidence": 0.0, "results": []}
+        top = np.argsort(-scores)[:k]
+        top = [int(d) for d in top if scores[d] > 0]
+        total = sum(weights.values())
+        confidence = sum(weights[t] for t in matched[top[0]]) / total if total else 0.0
+        return {
+            "confidence": round(confidence, 3),
+            "results": [
+                {**self.chunks[d], "score": round(float(scores[d]), 3), "text": self._text(d)}
+                for d in top
+            ],
+        }
+
+    def lookup(self, query: str, k: int = 4, min_confidence: float = MIN_CONFIDENCE) -> Optional[Dict[str, Any]]:
+        """search() when confident enough, else None (the caller falls back to web search)."""
+        found = self.search(query, k)
+        if found["results"] and found["confidence"] >= min_confidence:
+            self.hits += 1
+            return found
+        self.misses += 1
+        return None
+
+    def prometheus(self) -> str:
+        return (
+            "# TYPE local_index_lookups_total counter\n"
+            f'local_index_lookups_total{{result="hit"}} {self.hits}\n'
+            f'local_index_lookups_total{{result="miss"}} {self.misses}\n'
+        )
+
+local_index = LocalIndex()
+
+def refresh(docs_dir: str = DOCS_DIR, index_dir: str = INDEX_DIR) -> Optional[Dict[str, int]]:
+    """Bring the index up to date with docs_dir, if that folder exists."""
+    if not os.path.isdir(docs_dir):
+        return None
+    os.makedirs(index_dir, exist_ok=True)
+    # Several research processes start at once; one builds, the rest find it current
+    with open(os.path.join(index_dir, ".lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return build_index(docs_dir, index_dir)
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        print(refresh(sys.argv[2] if len(sys.argv) > 2 else DOCS_DIR))
+    elif len(sys.argv) >= 3 and sys.argv[1] == "query":
+        print(json.dumps(local_index.search(" ".join(sys.argv[2:])), indent=2)[:4000])
+    else:
+        print(__doc__)
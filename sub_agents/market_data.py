@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds each kind of data stays fresh
+PRICE_TTL = int(os.getenv("MARKET_PRICE_TTL", 60))
+FUNDAMENTALS_TTL = int(os.getenv("MARKET_FUNDAMENTALS_TTL", 24 * 3600))
+RECOMMENDATIONS_TTL = int(os.getenv("MARKET_RECOMMENDATIONS_TTL", 24 * 3600))
+CACHE_SIZE = int(os.getenv("MARKET_CACHE_SIZE", 2048))
+MAX_TICKERS = int(os.getenv("MARKET_MAX_TICKERS", 8))
+
+FUNDAMENTAL_FIELDS = (
+    "shortName", "sector", "industry", "currency", "marketCap", "trailingPE", "forwardPE",
+    "trailingEps", "forwardEps", "priceToBook", "dividendYield", "beta", "profitMargins",
+    "revenueGrowth", "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "targetMeanPrice",
+    "recommendationKey", "numberOfAnalystOpinions",
+)
+
+# Shared with the orchestrator's intent router: one definition of what counts as a ticker
+COMPANY_TICKERS = {
+    "apple": "AAPL", "microsoft": "MSFT", "google": "GOOGL", "alphabet": "GOOGL",
+    "amazon": "AMZN", "tesla": "TSLA", "nvidia": "NVDA", "meta": "META", "facebook": "META",
+    "netflix": "NFLX", "amd": "AMD", "intel": "INTC", "disney": "DIS", "walmart": "WMT",
+    "costco": "COST", "berkshire": "BRK-B", "jpmorgan": "JPM", "coca-cola": "KO",
+}
+# Upper-case words that look like tickers but are not: acronyms, state codes, shouting
+_NOT_TICKERS = {
+    "USA", "USD", "NYC", "LA", "SF", "UK", "EU", "IRA", "IRAS", "ETF", "ETFS", "CD", "CDS", "HSA",
+    "FSA", "APR", "APY", "IPO", "CEO", "CFO", "GDP", "FAQ", "OK", "TV", "PE", "EPS", "AI", "TTM",
+    "YTD", "ATH", "DCA", "ROI", "ROTH", "HYSA", "FIRE", "LLC", "INC", "NYSE", "FYI", "ASAP",
+    "HIGH", "LOW", "BUY", "SELL", "HOLD", "WHAT", "THE", "AND", "FOR", "NOT", "NOW", "NEW", "TOP",
+    "BEST", "ALL", "IS", "IT", "MY", "TO", "IN", "ON", "AT", "OF", "DO", "IF", "SO", "AM",
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI", "ID", "IL", "IA", "KS",
+    "KY", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
+    "ND", "OH", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+}
+_KNOWN_TICKERS = set(COMPANY_TICKERS.values())
+# Bare symbols: two to five capitals (plus a class suffix), not part of "P/E" or "A/B"
+_BARE_TICKER = re.compile(r"(?<![\w/$-])[A-Z]{2,5}(?:-[A-Z])?(?![\w/-])")
+
+def _yf():
+    # yfinance pulls in pandas and requests; import on first fetch, not at module load
+    import yfinance
+    return yfinance
+
+def extract_tickers(query: str) -> List[str]:
+    """
+    Tickers mentioned in a query: $TSLA, bare upper-case symbols, or well-known company
+    names. In an all-caps message only $-prefixed and known symbols count.
+    """
+    found = re.findall(r"\$([A-Za-z]{1,5}(?:-[A-Za-z])?)\b", query)
+    letters = [c for c in query if c.isalpha()]
+    shouting = len(letters) > 12 and sum(c.isupper() for c in letters) > 0.8 * len(letters)
+    found += [w for w in _BARE_TICKER.findall(query)
+              if w in _KNOWN_TICKERS or (not shouting and w not in _NOT_TICKERS)]
+    lowered = query.lower()
+    found += [t for name, t in COMPANY_TICKERS.items() if re.search(rf"\b{re.escape(name)}\b", lowered)]
+    return list(dict.fromkeys(t.upper() for t in found))[:MAX_TICKERS]
+
+def _clean(value):
+    # JSON friendly: no NaN/inf, plain Python numbers
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+class TTLCache:
+    """Thread-safe LRU cache where every entry carries its own expiry."""
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+class MarketData:
+    """
+    Shared market data for the stock server.
+
+    Price history for every ticker in a query comes from one batched yf.download
+    call; fundamentals and analyst recommendations are fetched per ticker in
+    parallel. Everything is kept in a TTL cache, and concurrent requests for the
+    same ticker wait on the one fetch already in flight instead of starting another.
+    """
+
+    def __init__(self, cache: Optional[TTLCache] = None):
+        self.cache = cache or TTLCache()
+        self._inflight: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    # --- single-flight helpers ---
+
+    def _claim(self, keys: List[tuple]):
+        """Split keys into (cached values, futures to wait on, keys this caller must fetch)."""
+        values, waiting, mine = {}, {}, []
+        with self._lock:
+            for key in keys:
+                value = self.cache.get(key)
+                if value is not None:
+                    values[key] = value
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                else:
+                    self._inflight[key] = Future()
+                    mine.append(key)
+        return values, waiting, mine
+
+    def _resolve(self, key: tuple, value, ttl: int):
+        if value is not None:
+            self.cache.set(key, value, ttl)
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def _get_many(self, kind: str, tickers: List[str], fetch: Callable[[List[str]], Dict[str, Any]], ttl: int) -> Dict[str, Any]:
+        keys = [(kind, t) for t in tickers]
+        values, waiting, mine = self._claim(keys)
+        if mine:
+            try:
+                fetched = fetch([t for _, t in mine])
+            except Exception as e:
+                print(f"[market_data] {kind} fetch failed for {[t for _, t in mine]}: {e}")
+                fetched = {}
+            for key in mine:
+                self._resolve(key, fetched.get(key[1]), ttl)
+                values[key] = fetched.get(key[1])
+        for key, future in waiting.items():
+            values[key] = future.result()
+        return {t: values.get((kind, t)) for t in tickers}
+
+    # --- fetchers (network) ---
+
+    @staticmethod
+    def _fetch_history(tickers: List[str]) -> Dict[str, Any]:
+        frame = _yf().download(
+            tickers, period="1y", interval="1d", group_by="ticker",
+            auto_adjust=False, threads=True, progress=False,
+        )
+        history = {}
+        for t in tickers:
+            try:
+                columns = frame.columns
+                if getattr(columns, "nlevels", 1) == 1:
+                    data = frame  # older yfinance, single ticker: flat columns
+                elif t in columns.get_level_values(0):
+                    data = frame[t]
+                else:
+                    data = frame.xs(t, axis=1, level=-1)
+                data = data.dropna(how="all")
+                if not data.empty:
+                    history[t] = data
+            except KeyError:
+                continue
+        return history
+
+    @staticmethod
+    def _fetch_fundamentals(tickers: List[str]) -> Dict[str, Any]:
+        def one(t):
+            info = _yf().Ticker(t).info or {}
+            return {field: _clean(info.get(field)) for field in FUNDAMENTAL_FIELDS}
+        return _parallel(tickers, one)
+
+    @staticmethod
+    def _fetch_recommendations(tickers: List[str]) -> Dict[str, Any]:
+        def one(t):
+            ticker = _yf().Ticker(t)
+            out = {"summary": [], "recent_changes": []}
+            recs = ticker.recommendations
+            if recs is not None and not recs.empty:
+                out["summary"] = [{k: _clean(v) for k, v in row.items()} for row in recs.head(4).to_dict("records")]
+            changes = getattr(ticker, "upgrades_downgrades", None)
+            if changes is not None and not changes.empty:
+                changes = changes.head(5).reset_index()
+                out["recent_changes"] = [{k: _clean(str(v) if k == "GradeDate" else v) for k, v in row.items()}
+                                         for row in changes.to_dict("records")]
+            return out
+        return _parallel(tickers, one)
+
+    # --- public API ---
+
+    def history(self, tickers: List[str]) -> Dict[str, Any]:
+        """One year of daily OHLCV per ticker (pandas DataFrame), batch downloaded."""
+        return self._get_many("history", tickers, self._fetch_history, PRICE_TTL)
+
+    def fundamentals(self, tickers: List[str]) -> Dict[str, Any]:
+        return self._get_many("fundamentals", tickers, self._fetch_fundamentals, FUNDAMENTALS_TTL)
+
+    def recommendations(self, tickers: List[str]) -> Dict[str, Any]:
+        return self._get_many("recommendations", tickers, self._fetch_recommendations, RECOMMENDATIONS_TTL)
+
+    def quotes(self, tickers: List[str]) -> Dict[str, Any]:
+        """Latest price and daily change, taken from the cached price history."""
+        quotes = {}
+        for t, frame in self.history(tickers).items():
+            if frame is None or frame.empty:
+                quotes[t] = None
+                continue
+            close = frame["Close"].dropna()
+            last = float(close.iloc[-1])
+            prev = float(close.iloc[-2]) if len(close) > 1 else last
+            quotes[t] = {
+                "price": round(last, 2),
+                "change_pct": round((last / prev - 1) * 100, 2) if prev else None,
+                "as_of": str(close.index[-1].date()),
+            }
+        return quotes
+
+    def snapshot(self, tickers: List[str]) -> Dict[str, Any]:
+        """Quote, fundamentals and analyst data for all tickers, fetched in parallel."""
+        fetched = _parallel(
+            ["quotes", "fundamentals", "recommendations"],
+            lambda kind: getattr(self, kind)(tickers),
+        )
+        return {
+            t: {kind: fetched[kind].get(t) for kind in ("quotes", "fundamentals", "recommendations")}
+            for t in tickers
+        }
+
+def _parallel(items: List[str], fn: Callable[[str], Any]) -> Dict[str, Any]:
+    results = {}
+    def run(item):
+        try:
+            results[item] = fn(item)
+        except Exception as e:
+            print(f"[market_data] fetch failed for {item}: {e}")
+            results[item] = None
+    threads = [threading.Thread(target=run, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+market_data = MarketData()
+
+# --- cached tools for the agent (same data, no extra fetches on a hit) ---
+
+def get_current_stock_price(symbol: str) -> str:
+    """
+    Use this function to get the latest price and daily change of a stock.
+
+    Args:
+        symbol (str): The stock ticker, e.g. AAPL.
+    Returns:
+        str: JSON with price, change_pct and as_of date.
+    """
+    return json.dumps(market_data.quotes([symbol.upper()]).get(symbol.upper()))
+
+def get_company_fundamentals(symbol: str) -> str:
+    """
+    Use this function to get key fundamentals (P/E, EPS, market cap, 52-week range, sector) of a company.
+
+    Args:
+        symbol (str): The stock ticker, e.g. AAPL.
+    Returns:
+        str: JSON of fundamental fields.
+    """
+    return json.dumps(market_data.fundamentals([symbol.upper()]).get(symbol.upper()))
+
+def get_analyst_recommendations(symbol: str) -> str:
+    """
+    Use this function to get analyst recommendation counts and recent rating changes for a stock.
+
+    Args:
+        symbol (str): The stock ticker, e.g. AAPL.
+    Returns:
+        str: JSON with summary and recent_changes.
+    """
+    return json.dumps(market_data.recommendations([symbol.upper()]).get(symbol.upper()))
+
+MARKET_TOOLS = [get_current_stock_price, get_company_fundamentals, get_analyst_recommendations]
@@ -0,0 +1,174 @@
+import atexit
+import copy
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class InMemoryBackend:
+    """Dict backed storage; nothing survives a restart. Handy for tests."""
+
+    def __init__(self):
+        self._rows = {}
+
+    def load(self, key: str) -> Optional[dict]:
+        row = self._rows.get(key)
+        return copy.deepcopy(row) if row is not None else None
+
+    def save_many(self, rows: dict):
+        self._rows.update(copy.deepcopy(rows))
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """One JSON document per user/session id in a WAL mode SQLite file."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS memory (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+    def load(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM memory WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, rows: dict):
+        # One transaction for the whole batch
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO memory (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in rows.items()],
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def merge(current: dict, updates: dict) -> dict:
+    """Shallow merge: nested dicts are updated in place, everything else is replaced."""
+    for k, v in updates.items():
+        if isinstance(v, dict) and isinstance(current.get(k), dict):
+            current[k].update(v)
+        else:
+            current[k] = v
+    return current
+
+
+class MemoryStore:
+    """
+    Per-user memory with an LRU cache in front of a pluggable backend.
+
+    get/update never touch disk when the user is cached. Updates are merged
+    atomically under a lock and written behind in batches every flush_interval
+    seconds, so a burst of requests does not serialize on file I/O.
+    """
+
+    def __init__(self, backend, defaults: Callable[[], dict], cache_size: int = 1024,
+                 flush_interval: float = 0.5):
+        self.backend = backend
+        self.defaults = defaults
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache: OrderedDict = OrderedDict()
+        self._dirty = {}
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="memory-write-behind", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _load(self, key: str) -> dict:
+        # Caller holds the lock
+        if key in self._dirty:
+            value = self._dirty[key]
+        elif key in self._inflight:
+            value = self._inflight[key]
+        elif key in self._cache:
+            value = self._cache[key]
+        else:
+            value = self.backend.load(key)
+            if value is None:
+                value = self.defaults()
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            # Dirty entries stay reachable through _dirty until flushed
+            self._cache.popitem(last=False)
+        return value
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            return copy.deepcopy(self._load(key))
+
+    def update(self, key: str, updates: dict) -> dict:
+        """Merge updates into the user's memory and schedule the write."""
+        with self._lock:
+            value = merge(self._load(key), copy.deepcopy(updates))
+            self._dirty[key] = value
+            return copy.deepcopy(value)
+
+    def seed_from_json(self, path: str, key: str = "default"):
+        """One-time import of a legacy single-user JSON memory file."""
+        if not os.path.exists(path) or self.backend.load(key) is not None:
+            return
+        with open(path, "r") as f:
+            self.update(key, json.load(f))
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            self._inflight = batch
+            snapshot = copy.deepcopy(batch)
+        try:
+            self.backend.save_many(snapshot)
+        except Exception:
+            with self._lock:
+                # Keep the unsaved values for the next flush unless they were updated again
+                for key, value in batch.items():
+                    self._dirty.setdefault(key, value)
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[memory_store] Warning: write-behind flush failed: {e}")
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.flush()
+        self.backend.close()
+
+
+def create_store(path: str, defaults: Callable[[], dict]) -> MemoryStore:
+    """Build a store from MEMORY_BACKEND ('sqlite' by default, or 'memory')."""
+    if os.getenv("MEMORY_BACKEND", "sqlite") == "memory":
+        backend = InMemoryBackend()
+    else:
+        backend = SQLiteBackend(path)
+    return MemoryStore(
+        backend,
+        defaults,
+        cache_size=int(os.getenv("MEMORY_CACHE_SIZE", 1024)),
+        flush_interval=float(os.getenv("MEMORY_FLUSH_INTERVAL", 0.5)),
+    )
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Model tiers, cheapest first. The orchestrator picks one per call from the NLU
+# confidence and how complex the query looks, and sends it with each intent request;
+# every agent maps a tier to a model, a reasoning effort and optional ReasoningTools.
+TIERS = ("light", "standard", "deep")
+DEFAULT_TIER = os.getenv("DEFAULT_MODEL_TIER", "standard")
+# MODEL_TIERING=0 pins every call to DEFAULT_TIER (e.g. to compare cost and latency)
+MODEL_TIERING = os.getenv("MODEL_TIERING", "1") != "0"
+
+# agent -> tier -> settings. Override any part with a JSON file of the same shape at
+# MODEL_POLICY_FILE: {"writer": {"deep": {"model": "gpt-5", "reasoning_effort": "low"}}}
+# reasoning_effort only applies to reasoning models (gpt-5*, o*); None keeps the provider default.
+DEFAULT_POLICY = {
+    "nlu": {
+        "light": {"model": "gpt-5-nano", "reasoning_effort": "minimal"},
+        "standard": {"model": "gpt-5-nano", "reasoning_effort": "low"},
+        "deep": {"model": "gpt-5-nano", "reasoning_effort": "medium"},
+    },
+    "budget": {
+        "light": {"model": "gpt-5-nano", "reasoning_effort": "minimal"},
+        "standard": {"model": "gpt-5-nano", "reasoning_effort": None},
+        "deep": {"model": "gpt-5-mini", "reasoning_effort": "medium"},
+    },
+    "stock": {
+        "light": {"model": "gpt-5-nano", "reasoning_effort": "minimal"},
+        "standard": {"model": "gpt-5-nano", "reasoning_effort": None},
+        "deep": {"model": "gpt-5-mini", "reasoning_effort": "medium", "reasoning_tools": True},
+    },
+    "research": {
+        "light": {"model": "gpt-5-nano", "reasoning_effort": "minimal"},
+        "standard": {"model": "gpt-5-nano", "reasoning_effort": None},
+        "deep": {"model": "gpt-5-mini", "reasoning_effort": "medium"},
+    },
+    # Light writer calls are short replies; standard keeps gpt-4o for answer quality
+    "writer": {
+        "light": {"model": "gpt-4o-mini"},
+        "standard": {"model": "gpt-4o"},
+        "deep": {"model": "gpt-5-mini", "reasoning_effort": "low"},
+    },
+}
+
+# Complexity signals
+LIGHT_MAX_CHARS = int(os.getenv("LIGHT_TIER_MAX_CHARS", 60))
+DEEP_MIN_CHARS = int(os.getenv("DEEP_TIER_MIN_CHARS", 600))
+# NLU must be this sure for the light tier; below DEEP_MAX_CONFIDENCE the query is escalated
+LIGHT_MIN_CONFIDENCE = float(os.getenv("LIGHT_TIER_MIN_CONFIDENCE", 0.8))
+DEEP_MAX_CONFIDENCE = float(os.getenv("DEEP_TIER_MAX_CONFIDENCE", 0.5))
+DEEP_MIN_TICKERS = int(os.getenv("DEEP_TIER_MIN_TICKERS", 3))
+DEEP_MIN_INTENTS = int(os.getenv("DEEP_TIER_MIN_INTENTS", 3))
+_DEEP_WORDS = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|competitive|competitors?|analy[sz]e|analysis|outlook|"
+    r"valuation|forecast|scenarios?|strateg(y|ies)|trade-?offs?|pros and cons|rebalanc\w*|allocation|"
+    r"long[- ]term|step[- ]by[- ]step|in[- ]depth|detailed)\b",
+    re.IGNORECASE,
+)
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+def load_policy(path: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    policy = json.loads(json.dumps(DEFAULT_POLICY))
+    path = path or os.getenv("MODEL_POLICY_FILE")
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            _merge(policy, json.load(f))
+    return policy
+
+POLICY = load_policy()
+
+def normalize_tier(tier: Optional[str]) -> str:
+    if not MODEL_TIERING or tier not in TIERS:
+        return DEFAULT_TIER
+    return tier
+
+def max_tier(tiers: Iterable[Optional[str]]) -> str:
+    ranked = [TIERS.index(t) for t in tiers if t in TIERS]
+    return TIERS[max(ranked)] if ranked else DEFAULT_TIER
+
+def choose_tier(query: str, confidence: Optional[float] = None, intents: int = 1, tickers: int = 0) -> str:
+    """
+    light: a short, single-intent question the NLU is sure about ("what's AAPL at?").
+    deep: comparison/analysis wording, several tickers or intents, a long query,
+    or low NLU confidence. Everything else is standard. `tickers` counts symbols
+    that passed market_data.extract_tickers, not every capitalised word.
+    """
+    if not MODEL_TIERING:
+        return DEFAULT_TIER
+    query = query or ""
+    if (len(query) >= DEEP_MIN_CHARS or tickers >= DEEP_MIN_TICKERS or intents >= DEEP_MIN_INTENTS
+            or _DEEP_WORDS.search(query)
+            or (confidence is not None and confidence < DEEP_MAX_CONFIDENCE)):
+        return "deep"
+    if (len(query) <= LIGHT_MAX_CHARS and intents <= 1 and tickers <= 1
+            and (confidence is None or confidence >= LIGHT_MIN_CONFIDENCE)):
+        return "light"
+    return "standard"
+
+def settings_for(agent: str, tier: Optional[str] = None) -> Dict[str, Any]:
+    tier = normalize_tier(tier)
+    return {"tier": tier, **POLICY[agent][tier]}
+
+def is_reasoning_model(model: str) -> bool:
+    return model.startswith(("gpt-5", "o1", "o3", "o4")) and not model.startswith("gpt-5-chat")
+
+def build_model(settings: Dict[str, Any]):
+    """An OpenAIChat for one agent/tier; agno is imported here, not at module load."""
+    from agno.models.openai import OpenAIChat
+    kwargs = {"id": settings["model"]}
+    if settings.get("reasoning_effort") and is_reasoning_model(settings["model"]):
+        kwargs["reasoning_effort"] = settings["reasoning_effort"]
+    return OpenAIChat(**kwargs)
+
+def reasoning_tools(settings: Dict[str, Any]) -> List[Any]:
+    """[ReasoningTools] when the tier asks for explicit think/analyze steps, else []."""
+    if not settings.get("reasoning_tools"):
+        return []
+    from agno.tools.reasoning import ReasoningTools
+    return [ReasoningTools(add_instructions=True)]
+
+def tier_metrics(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """What to report next to a run's token metrics."""
+    return {
+        "model": settings["model"],
+        "tier": settings["tier"],
+        "reasoning_effort": settings.get("reasoning_effort") or "default",
+    }
@@ -0,0 +1,29 @@
+import json
+from datetime import date
+from typing import Any, Dict, Optional
+
+# Provider-side prompt caching matches on the longest identical prefix, so every
+# message is laid out from most to least shareable:
+#   system instructions (static, identical for every run of an agent)
+#   data blocks shared across users (e.g. MARKET_DATA for a ticker)
+#   per-user blocks (USER_CONTEXT, BUDGET_FACTS)
+#   the question itself
+#   today's date, last, instead of add_datetime_to_context in the system prompt
+
+def compose_message(query: str, blocks: Optional[Dict[str, Any]] = None, today: Optional[date] = None) -> str:
+    """Data blocks in the order given, then the question, then the date."""
+    parts = [
+        f"{label}:\n{data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str, sort_keys=True)}"
+        for label, data in (blocks or {}).items() if data
+    ]
+    parts.append(f"QUESTION:\n{query}")
+    parts.append(f"Today's date: {(today or date.today()).isoformat()}")
+    return "\n\n".join(parts)
+
+def with_cache_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Add cached_input_tokens (Agno reports it as cache_read_tokens) and the hit ratio for this run."""
+    cached = metrics.get("cache_read_tokens") or metrics.get("cached_tokens") or 0
+    input_tokens = metrics.get("input_tokens") or 0
+    metrics["cached_input_tokens"] = cached
+    metrics["prompt_cache_hit_ratio"] = round(cached / input_tokens, 4) if input_tokens else 0.0
+    return metrics
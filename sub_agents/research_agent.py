@@ -1,51 +1,122 @@
-from agno.agent import Agent, RunOutput
-from agno.exceptions import RetryAgentRun
-from agno.tools.tavily import TavilyTools
-from agno.models.openai import OpenAIChat
+from typing import TYPE_CHECKING
 from fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+import asyncio
 import os
+import time
+import uuid
 import dotenv
+from agent_pool import PoolSaturated, TieredAgentPool
+from model_tiers import DEFAULT_TIER, build_model, choose_tier, reasoning_tools, settings_for, tier_metrics
+from search_cache import SEARCH_TOOLS, web
+from local_index import local_index, refresh
+from prompt_layout import compose_message, with_cache_metrics
+from warmup import Warmup
+
+if TYPE_CHECKING:
+  from agno.agent import Agent, RunOutput
 
 dotenv.load_dotenv()
 
 os.environ['TAVILY_API_KEY'] = os.getenv("TAVILY_API_KEY")
 mcp = FastMCP()
-# Create research agent with Tavily search
-research_agent = Agent(
-    name="Research Agent",\
-    model=OpenAIChat(id="gpt-5-nano"),
-    tools=[TavilyTools()],
+
+# Agent workers per process; run several processes with RESEARCH_PROCESSES (see docker-compose)
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", 4))
+# Requests allowed to wait for a worker before new ones are turned away
+RESEARCH_MAX_QUEUE = int(os.getenv("RESEARCH_MAX_QUEUE", 16))
+# Runs per request when the model comes back empty
+RESEARCH_MAX_ATTEMPTS = int(os.getenv("RESEARCH_MAX_ATTEMPTS", 3))
+
+def research_agent(tier: str = DEFAULT_TIER) -> "Agent":
+  from agno.agent import Agent
+  settings = settings_for("research", tier)
+  # No history: conversation context comes from the orchestrator with each request,
+  # so a worker carries nothing from one request to the next
+  return Agent(
+    name="Research Agent",
+    model=build_model(settings),
+    tools=[*reasoning_tools(settings), *SEARCH_TOOLS],
     instructions="""
         You are a research assistant that helps find accurate information.
-        Use Tavily to search for current information and provide comprehensive answers.
+        Use web_search to search for current information and provide comprehensive answers.
+        Only call extract_pages when a result's snippet is not enough to answer.
+
+        When LOCAL_SOURCES are given before the QUESTION, answer from them and
+        cite their source file; search the web only for what they don't cover.
 
-        don't use chat_history unless explicitly referenced
-        
         Always cite your sources and provide relevant context.
     """,
-    add_history_to_context=True,
-    num_history_runs=3, 
     markdown=True
-)
+  )
+
+def with_local_sources(query: str, found: dict) -> str:
+  sources = [{k: r[k] for k in ("source", "title", "text")} for r in found["results"]]
+  return compose_message(query, {"LOCAL_SOURCES": sources})
+
+# Isolated workers, built once per model tier; each handles one request at a time
+research_pool = TieredAgentPool(research_agent, size=RESEARCH_WORKERS, max_waiting=RESEARCH_MAX_QUEUE)
+
+warmup = Warmup("research")
+
+@warmup.step
+def local_index_refresh():
+  # Evergreen docs are indexed locally and answered without web search when they match well;
+  # a failed build only means every question goes to the web
+  try:
+    print(f"[research] local index: {refresh()}")
+  except Exception as e:
+    print(f"[research] local index refresh failed: {type(e).__name__}: {e}")
+
+warmup.step(research_pool.warm)
+warmup.install(mcp)
+warmup.start()
 
-retry_count = 0
 @mcp.tool()
 async def research(message: dict) -> dict:
   input = message['processed_input']
-  agent = research_agent
+  queued = time.perf_counter()
   try:
-    response: RunOutput = await agent.arun(input)
-    text = response.content if hasattr(response, "content") else str(response) 
-    metrics = response.metrics
-    print(metrics)
-    if text == None and retry_count<2:
-      retry_count+=1
-      raise RetryAgentRun(
-         f"Conduct research based on the users query. users:{input}"
-      )
-    return {"metrics": metrics.to_dict(), "content": response.content}
+    await warmup.wait()
+    # BM25 over memory-mapped arrays: CPU and page faults, so off the event loop
+    local = await asyncio.to_thread(local_index.lookup, input)
+    request = with_local_sources(input, local) if local else compose_message(input)
+    # The orchestrator sends the tier; older clients get one picked from the query here
+    settings = settings_for("research", message.get("tier") or choose_tier(input))
+    async with research_pool.acquire(settings["tier"]) as agent:
+      queue_wait = time.perf_counter() - queued
+      # Fresh session per request, so nothing leaks between users sharing a worker
+      session_id = uuid.uuid4().hex
+      prompt = request
+      for attempt in range(1, RESEARCH_MAX_ATTEMPTS + 1):
+        response: "RunOutput" = await agent.arun(prompt, session_id=session_id)
+        if response.content:
+          break
+        prompt = f"Conduct research based on the users query. users:{request}"
+    metrics = with_cache_metrics(response.metrics.to_dict())
+    metrics.update({
+      **tier_metrics(settings),
+      "attempts": attempt,
+      "queue_wait": queue_wait,
+      "queue_depth": research_pool.waiting,
+      "search_cache_hit_ratio": web.cache.hit_rate("search"),
+      "local_index_hit": int(local is not None),
+    })
+    return {"metrics": metrics, "content": response.content}
+  except PoolSaturated as e:
+    return f"Tool error: research server busy, retry later ({e})"
   except Exception as e:
     return f"Tool error: {type(e).__name__}: {e}"
-  
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+  # Per process; scrape every process or sum them in the collector
+  return PlainTextResponse(research_pool.prometheus("research") + web.cache.prometheus() + local_index.prometheus())
+
+# ASGI app for running several processes: uvicorn research_agent:app --workers N
+# Stateless, so any process can answer any request without a shared MCP session
+app = mcp.http_app(stateless_http=True)
+
 if __name__ == '__main__':
-  mcp.run(transport="streamable-http")
\ No newline at end of file
+  mcp.run(transport="streamable-http")
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds results stay fresh: search results age faster than page content
+SEARCH_TTL = int(os.getenv("SEARCH_CACHE_TTL", 24 * 3600))
+EXTRACT_TTL = int(os.getenv("EXTRACT_CACHE_TTL", 7 * 24 * 3600))
+# Total size of cached payloads before least recently used rows are evicted
+MAX_BYTES = int(float(os.getenv("SEARCH_CACHE_MAX_MB", 200)) * 1024 * 1024)
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite")
+# Page text handed to the model is capped; the full page stays in the cache
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", 8000))
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "is", "are", "what", "whats", "how",
+    "does", "do", "me", "my", "i", "please", "can", "you", "tell", "about", "with", "its",
+    "explain", "explained", "explanation", "definition", "define", "meaning", "mean", "means",
+    "work", "works", "guide", "overview", "basics",
+}
+
+def normalize_search(query: str) -> str:
+    """
+    Canonical form of a search query, so "what is a Roth IRA" and "roth ira explained"
+    share one cache entry: lowercase, filler words dropped. Word order is kept, so
+    "roll 401k to roth ira" and "roll roth ira to 401k" stay different.
+    """
+    text = query.lower().replace("’", "'").replace("'", "")
+    words = (w.strip("./-") for w in re.findall(r"[\w$%./-]+", text))
+    return " ".join(w for w in words if w and w not in _STOPWORDS) or query.strip().lower()
+
+class SearchCache:
+    """
+    Disk cache for web search results and extracted pages.
+
+    SQLite in WAL mode so every research process on the host shares it. Entries
+    expire by TTL, and once the payloads exceed max_bytes the least recently used
+    rows go first. Concurrent misses for the same key in one process wait on the
+    single fetch already in flight.
+    """
+
+    def __init__(self, path: str = SEARCH_CACHE_PATH, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = {kind: {"hits": 0, "misses": 0, "coalesced": 0} for kind in ("search", "extract")}
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, kind TEXT, expires_at REAL, accessed_at REAL, size INTEGER, value TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(kind: str, *parts) -> str:
+        return hashlib.sha256(json.dumps([kind, *parts]).encode()).hexdigest()
+
+    def _read(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT expires_at, value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] < now:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(row[1])
+
+    def _write(self, key: str, kind: str, value: Any, ttl: int):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, now + ttl, now, len(data), data),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Expired rows first, then least recently used until under the size limit
+        self._db.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed, freed = [], 0
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def get_or_fetch(self, kind: str, key: str, fetch: Callable[[], Any], ttl: int) -> Any:
+        """Cached value for key, else the result of fetch(), shared with concurrent callers."""
+        value = self._read(key)
+        if value is not None:
+            self.stats[kind]["hits"] += 1
+            return value
+        with self._lock:
+            future = self._inflight.get(key)
+            mine = future is None
+            if mine:
+                future = self._inflight[key] = Future()
+        if not mine:
+            self.stats[kind]["coalesced"] += 1
+            return future.result()
+        self.stats[kind]["misses"] += 1
+        try:
+            value = fetch()
+            if value:
+                self._write(key, kind, value, ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def hit_rate(self, kind: str) -> float:
+        s = self.stats[kind]
+        served = s["hits"] + s["coalesced"]
+        return served / max(served + s["misses"], 1)
+
+    def prometheus(self) -> str:
+        lines = ["# TYPE search_cache_requests_total counter"]
+        for kind, counts in self.stats.items():
+            for result, value in counts.items():
+                lines.append(f'search_cache_requests_total{{kind="{kind}",result="{result}"}} {value}')
+        lines.append("# TYPE search_cache_hit_ratio gauge")
+        for kind in self.stats:
+            lines.append(f'search_cache_hit_ratio{{kind="{kind}"}} {self.hit_rate(kind)}')
+        return "\n".join(lines) + "\n"
+
+class WebSearch:
+    """Tavily search and extract behind the shared cache."""
+
+    def __init__(self, cache: Optional[SearchCache] = None, client=None):
+        self.cache = cache or SearchCache()
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Imported on first search so cache hits never load the Tavily SDK
+            from tavily import TavilyClient
+            self._client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        return self._client
+
+    def search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        normalized = normalize_search(query)
+        key = SearchCache.make_key("search", normalized, max_results)
+
+        def fetch():
+            response = self.client.search(query, max_results=max_results)
+            return {
+                "query": query,
+                "results": [
+                    {k: r.get(k) for k in ("title", "url", "content", "score")}
+                    for r in response.get("results", [])
+                ],
+            }
+
+        return self.cache.get_or_fetch("search", key, fetch, SEARCH_TTL)
+
+    def extract(self, urls: List[str]) -> Dict[str, str]:
+        """url -> page text, fetching only the pages not cached yet."""
+        pages = {}
+        for url in urls:
+            def fetch(url=url):
+                response = self.client.extract(urls=[url])
+                results = response.get("results") or []
+                return results[0].get("raw_content") if results else None
+            pages[url] = self.cache.get_or_fetch("extract", SearchCache.make_key("extract", url), fetch, EXTRACT_TTL)
+        return pages
+
+web = WebSearch()
+
+# --- cached tools for the agent (same results, no Tavily call on a hit) ---
+
+async def web_search(query: str, max_results: int = 5) -> str:
+    """
+    Use this function to search the web for current information.
+
+    Args:
+        query (str): What to search for.
+        max_results (int): Number of results to return. Defaults to 5.
+    Returns:
+        str: JSON list of results with title, url, content and score.
+    """
+    return json.dumps(await asyncio.to_thread(web.search, query, max_results), ensure_ascii=False)
+
+async def extract_pages(urls: List[str]) -> str:
+    """
+    Use this function to read the full text of web pages, e.g. search results worth a closer look.
+
+    Args:
+        urls (List[str]): Page URLs to read.
+    Returns:
+        str: JSON object of url -> page text.
+    """
+    pages = await asyncio.to_thread(web.extract, urls)
+    return json.dumps({u: (text or "")[:EXTRACT_MAX_CHARS] for u, text in pages.items()}, ensure_ascii=False)
+
+SEARCH_TOOLS = [web_search, extract_pages]
@@ -1,14 +1,17 @@
-from typing import Literal, Optional
-from datetime import datetime
+from typing import TYPE_CHECKING
 from fastmcp import FastMCP
-import yfinance as yf
 from textwrap import dedent
-from agno.agent import Agent, RunOutput
-from agno.models.openai import OpenAIChat
-from agno.tools.reasoning import ReasoningTools
-from agno.tools.yfinance import YFinanceTools
 import os
+import asyncio
 from dotenv import load_dotenv
+from agent_pool import TieredAgentPool
+from model_tiers import DEFAULT_TIER, build_model, choose_tier, reasoning_tools, settings_for, tier_metrics
+from market_data import MARKET_TOOLS, extract_tickers, market_data
+from prompt_layout import compose_message, with_cache_metrics
+from warmup import Warmup
+
+if TYPE_CHECKING:
+    from agno.agent import Agent, RunOutput
 
 load_dotenv()
 
@@ -18,14 +21,23 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 # Change transport to 'streamable_http'
 mcp = FastMCP()
 # Define the finance agent
-def stock_agent() -> Agent:
+def stock_agent(tier: str = DEFAULT_TIER) -> "Agent":
+    # agno and the OpenAI SDK are imported here, on the warm-up thread, not at module load
+    from agno.agent import Agent
+    settings = settings_for("stock", tier)
     return Agent(
-            model=OpenAIChat(id="gpt-5-nano"),
-            add_history_to_context=True,
-            num_history_runs=3,
-            tools=[ReasoningTools(add_instructions=True), YFinanceTools()],
+            model=build_model(settings),
+            # ReasoningTools only where the tier asks for them (deep analyses by default)
+            tools=[*reasoning_tools(settings), *MARKET_TOOLS],
             instructions=dedent("""\
-                don't use chat_history unless explicitly referenceddon't use chat_history unless explicitly referenced
+                Market data for the tickers in the question is prefetched and given as
+                MARKET_DATA before the user's QUESTION. Use it first; only call the market
+                data tools for tickers or fields missing there.
+
+                ANALYTICS holds precomputed numbers per ticker: 52-week high/low and distance
+                from them, 1m/3m/6m/1y returns, annualized volatility, 50/200-day moving
+                averages, max drawdown and P/E / P/B relative to the peer median.
+                Quote these numbers as given; do not recompute them. Your job is the commentary.
                                 
                 You are a seasoned Wall Street analyst with deep expertise in market analysis! 📊
 
@@ -50,7 +62,7 @@ def stock_agent() -> Agent:
                 - Include clear section headers
                 - Add emoji indicators for trends (📈 📉)
                 - Highlight key insights with bullet points
-                - Compare metrics to industry averages
+                - Compare metrics to the peer medians in ANALYTICS
                 - Include technical term explanations
                 - End with a forward-looking analysis
 
@@ -59,11 +71,43 @@ def stock_agent() -> Agent:
                 - Note market uncertainties
                 - Mention relevant regulatory concerns\
             """),
-            add_datetime_to_context=True,
             markdown=True,
             stream_intermediate_steps=True,
         )
 
+# Agents are built once during warm-up, not per tool call; one set per model tier
+stock_pool = TieredAgentPool(stock_agent, size=int(os.getenv("STOCK_AGENT_POOL_SIZE", 4)))
+
+warmup = Warmup("stock")
+
+@warmup.step
+def load_market_libraries():
+    # yfinance and pandas are only needed once a request comes in
+    import yfinance
+    import stock_analytics
+
+warmup.step(stock_pool.warm)
+warmup.install(mcp)
+warmup.start()
+
+def prefetch_context(query: str) -> dict:
+    """Batched market data plus locally computed analytics for every ticker in the query."""
+    tickers = extract_tickers(query)
+    if not tickers:
+        return {}
+    snapshot = market_data.snapshot(tickers)
+    from stock_analytics import compute_analytics
+    # history() is served from the cache filled by snapshot()
+    analytics = compute_analytics(
+        market_data.history(tickers),
+        {t: data["fundamentals"] for t, data in snapshot.items()},
+    )
+    return {"MARKET_DATA": snapshot, "ANALYTICS": analytics}
+
+def with_market_data(query: str, prefetched: dict) -> str:
+    # Market data for a ticker is the same for every user, so it goes ahead of the question
+    return compose_message(query, prefetched)
+
 # Register the finance agent as a tool
 @mcp.tool
 async def finance_analyzer(query: dict) -> dict:
@@ -72,10 +116,19 @@ async def finance_analyzer(query: dict) -> dict:
     """
     # Assuming the agent can be invoked with a string query and returns a string response
     # You might need to adapt this based on how your agent is designed to be called
-    agent = stock_agent()
     try:
-        response: RunOutput = await agent.arun(query['processed_input'])
-        return {"metrics": response.metrics.to_dict(), "content": response.content}
+        await warmup.wait()
+        # One batched, cached fetch for every ticker in the query, shared across users
+        prefetched = await asyncio.to_thread(prefetch_context, query['processed_input'])
+        # The orchestrator sends the tier; older clients get one picked from the query here
+        settings = settings_for("stock", query.get("tier") or choose_tier(
+            query['processed_input'], tickers=len(prefetched.get("MARKET_DATA", {}))))
+        async with stock_pool.acquire(settings["tier"]) as agent:
+            response: "RunOutput" = await agent.arun(with_market_data(query['processed_input'], prefetched))
+        metrics = with_cache_metrics(response.metrics.to_dict())
+        metrics.update(tier_metrics(settings))
+        metrics["analytics_tickers"] = len(prefetched.get("ANALYTICS", {}))
+        return {"metrics": metrics, "content": response.content}
     except Exception as e:
         return f"Tool error: {type(e).__name__}: {e}"
 
@@ -0,0 +1,76 @@
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+RETURN_WINDOWS = {"1m": 21, "3m": 63, "6m": 126, "1y": 252}
+PEER_MULTIPLES = ("trailingPE", "forwardPE", "priceToBook")
+
+
+def _panel(history: Dict[str, pd.DataFrame], column: str) -> pd.DataFrame:
+    """One column (Close, High, ...) for every ticker, aligned on date."""
+    frames = {t: df[column] for t, df in history.items() if df is not None and column in df}
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1).sort_index().ffill()
+
+
+def price_metrics(history: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Price based metrics for many tickers at once, one row per ticker:
+    52-week range, trailing returns, annualized volatility, moving averages
+    and maximum drawdown over the last year.
+    """
+    close = _panel(history, "Close")
+    if close.empty:
+        return pd.DataFrame()
+    high = _panel(history, "High").reindex(columns=close.columns)
+    low = _panel(history, "Low").reindex(columns=close.columns)
+    last = close.iloc[-1]
+
+    out = pd.DataFrame(index=close.columns)
+    out["price"] = last
+    out["high_52w"] = high.max().fillna(close.max())
+    out["low_52w"] = low.min().fillna(close.min())
+    out["pct_below_52w_high"] = (last / out["high_52w"] - 1) * 100
+    out["pct_above_52w_low"] = (last / out["low_52w"] - 1) * 100
+
+    for label, days in RETURN_WINDOWS.items():
+        base = close.iloc[-days - 1] if len(close) > days else close.iloc[0]
+        out[f"return_{label}_pct"] = (last / base - 1) * 100
+
+    daily = close.pct_change(fill_method=None)
+    out["volatility_annual_pct"] = daily.std() * np.sqrt(TRADING_DAYS) * 100
+    for window in (50, 200):
+        sma = close.rolling(window, min_periods=window).mean().iloc[-1]
+        out[f"sma_{window}"] = sma
+        out[f"above_sma_{window}"] = last > sma
+    out["max_drawdown_pct"] = (close / close.cummax() - 1).min() * 100
+    return out
+
+
+def peer_multiples(fundamentals: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """Valuation multiples relative to the median of the other tickers in the same question."""
+    frame = pd.DataFrame.from_dict(
+        {t: {m: (f or {}).get(m) for m in PEER_MULTIPLES} for t, f in fundamentals.items()},
+        orient="index",
+    ).apply(pd.to_numeric, errors="coerce")
+    if len(frame) < 2:
+        return pd.DataFrame(index=frame.index)
+    # Non-positive multiples (losses) are not meaningful to compare
+    frame = frame.where(frame > 0)
+    return (frame / frame.median()).add_suffix("_vs_peer_median")
+
+
+def compute_analytics(history: Dict[str, pd.DataFrame], fundamentals: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Structured metrics per ticker, rounded and JSON friendly, ready to hand to the agent."""
+    history = {t: df for t, df in history.items() if df is not None and not df.empty}
+    table = price_metrics(history)
+    multiples = peer_multiples({t: f for t, f in fundamentals.items() if f})
+    if not multiples.empty:
+        table = table.join(multiples, how="outer")
+    table = table.replace([np.inf, -np.inf], np.nan).round(2).astype(object)
+    table = table.where(pd.notna(table), None)
+    return {t: {k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()}
+            for t, row in table.to_dict("index").items()}
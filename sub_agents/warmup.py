@@ -0,0 +1,76 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+# Longest a tool call waits for warm-up before failing
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 120))
+
+class Warmup:
+    """
+    Slow start-up work (heavy imports, building agent pools, indexes) run on a
+    background thread, so the module imports quickly and the server binds its
+    port right away. /ready answers 503 until every step has finished.
+    `done` is set when the run ends either way; `ready` only when it succeeded.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.steps: List[Callable[[], None]] = []
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def step(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Register a warm-up step; usable as a decorator. Steps run in order."""
+        self.steps.append(fn)
+        return fn
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            for fn in self.steps:
+                t = time.perf_counter()
+                try:
+                    fn()
+                except Exception as e:
+                    self.error = f"{fn.__name__}: {type(e).__name__}: {e}"
+                    print(f"[{self.name}] warm-up failed in {self.error}")
+                    return
+                self.timings[fn.__name__] = round(time.perf_counter() - t, 3)
+            self.timings["total"] = round(time.perf_counter() - started, 3)
+            print(f"[{self.name}] ready after {self.timings['total']:.2f}s {self.timings}")
+            self.ready.set()
+        finally:
+            self.done.set()
+
+    async def wait(self, timeout: float = WARMUP_TIMEOUT):
+        """For tool calls that arrive before warm-up is done; raises at once if it failed."""
+        if self.ready.is_set():
+            return
+        if self.error:
+            raise RuntimeError(f"{self.name} warm-up failed ({self.error})")
+        self.start()
+        await asyncio.to_thread(self.done.wait, timeout)
+        if self.error:
+            raise RuntimeError(f"{self.name} warm-up failed ({self.error})")
+        if not self.ready.is_set():
+            raise RuntimeError(f"{self.name} is still warming up")
+
+    def install(self, mcp):
+        """Add GET /ready to a FastMCP server: 200 once warm, 503 before (or after a failed step)."""
+        @mcp.custom_route("/ready", methods=["GET"])
+        async def ready(request: Request) -> JSONResponse:
+            body = {"ready": self.ready.is_set(), "timings": self.timings, "error": self.error}
+            return JSONResponse(body, status_code=200 if self.ready.is_set() else 503)